@@ -0,0 +1,72 @@
+import os
+from collections import OrderedDict
+
+import pygame
+
+PIECE_NAMES = ('pawn', 'rook', 'knight', 'bishop', 'queen', 'king')
+COLORS = ('white', 'black')
+
+class Assets:
+    # Images, fonts and rendered text for the GUI, each made once. The
+    # twelve piece images are decoded once into a single atlas surface;
+    # scaled copies are cached by size, fonts by size, and rendered text
+    # surfaces in a least-recently-used cache of text_cache_size entries.
+
+    def __init__(self, image_dir="images", text_cache_size=256):
+        self.image_dir = image_dir
+        self.text_cache_size = text_cache_size
+        self.atlas = None
+        self.regions = {}
+        self.scaled = {}
+        self.fonts = {}
+        self.texts = OrderedDict()
+
+    def load_atlas(self):
+        images = {}
+        for color in COLORS:
+            for piece in PIECE_NAMES:
+                name = f"{color}_{piece}"
+                images[name] = pygame.image.load(os.path.join(self.image_dir, f"{name}.png"))
+        width = sum(image.get_width() for image in images.values())
+        height = max(image.get_height() for image in images.values())
+        self.atlas = pygame.Surface((width, height), pygame.SRCALPHA)
+        x = 0
+        for name, image in images.items():
+            self.atlas.blit(image, (x, 0))
+            self.regions[name] = pygame.Rect(x, 0, image.get_width(), image.get_height())
+            x += image.get_width()
+        if pygame.display.get_surface() is not None:
+            self.atlas = self.atlas.convert_alpha()
+
+    def image(self, name, size):
+        # The piece image `name` (e.g. 'white_pawn') scaled to size x size
+        key = (name, size)
+        image = self.scaled.get(key)
+        if image is None:
+            if self.atlas is None:
+                self.load_atlas()
+            image = pygame.transform.scale(self.atlas.subsurface(self.regions[name]), (size, size))
+            self.scaled[key] = image
+        return image
+
+    def images(self, size):
+        # All piece images at one size, keyed by name
+        return {f"{color}_{piece}": self.image(f"{color}_{piece}", size) for color in COLORS for piece in PIECE_NAMES}
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = pygame.font.Font(None, size)
+        return font
+
+    def text(self, text, size, color):
+        key = (text, size, color)
+        surface = self.texts.get(key)
+        if surface is not None:
+            self.texts.move_to_end(key)
+            return surface
+        surface = self.font(size).render(text, True, color)
+        self.texts[key] = surface
+        if len(self.texts) > self.text_cache_size:
+            self.texts.popitem(last=False)
+        return surface
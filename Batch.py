@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from Engine import Engine
+from ChessGame import BOARD_BACKENDS
+from Pgn import read_games, PgnError
+from Transposition import TranspositionTable
+from config import BOARD_BACKEND
+
+# Transposition table size of each worker when evaluating final positions
+WORKER_HASH_MB = 4
+# Chunks handed to the pool ahead of the results, per worker: enough to
+# keep every worker busy without reading the whole archive into memory
+CHUNKS_IN_FLIGHT = 2
+PROGRESS_INTERVAL = 5.0  # seconds
+
+# Per-process state, set up by init_worker
+_backend = BOARD_BACKEND
+_engine = None
+_depth = 0
+
+
+def init_worker(backend, depth, hash_mb):
+    global _backend, _engine, _depth
+    _backend = backend
+    _depth = depth
+    _engine = Engine(None, TranspositionTable(hash_mb)) if depth > 0 else None
+
+
+def validate_game(index, record):
+    # Replays one PgnGame and adjudicates its final position. Returns the
+    # JSON-ready result; a game with an illegal move is reported with the
+    # ply it failed at and the position before that move.
+    result = {
+        'index': index,
+        'white': record.tags.get('White'),
+        'black': record.tags.get('Black'),
+        'declared': record.tags.get('Result', record.result),
+        'legal': True,
+        'error': None,
+    }
+    try:
+        game = record.replay(_backend)
+    except PgnError as error:
+        result['legal'] = False
+        result['error'] = str(error)
+        game = error.game
+    result['plies'] = len(game.board.move_history) if game is not None else 0
+    if game is None:
+        return result
+
+    board = game.board
+    status = game.status()
+    if status.checkmate:
+        ending, adjudicated = 'checkmate', '0-1' if status.turn == 'white' else '1-0'
+    elif status.stalemate:
+        ending, adjudicated = 'stalemate', '1/2-1/2'
+    elif status.threefold_repetition:
+        ending, adjudicated = 'threefold repetition', '1/2-1/2'
+    elif status.fifty_move_rule:
+        ending, adjudicated = 'fifty-move rule', '1/2-1/2'
+    else:
+        ending, adjudicated = None, None
+    result['ending'] = ending
+    result['adjudicated'] = adjudicated
+    # Mate and stalemate decide the game; other results (resignation,
+    # time, agreement, a claimable draw) cannot be checked from the moves
+    result['result_ok'] = adjudicated == result['declared'] if status.checkmate or status.stalemate else None
+    result['repetition'] = max(board.position_counts.values()) >= 3
+    result['fen'] = game.to_fen()
+
+    if _engine is not None and ending is None:
+        _engine.game = game
+        _engine.tt.clear()
+        _engine.orderer.clear()
+        search = _engine.search(max_depth=_depth)
+        # From white's point of view, in centipawns
+        score = search.score if board.turn == 'white' else -search.score
+        result['eval'] = {'score': score, 'depth': search.depth,
+                          'move': game.move_to_uci(*search.move) if search.move is not None else None}
+    return result
+
+def validate_chunk(chunk):
+    # Runs in a worker process; returns its pid and busy time with the
+    # results so the parent can report throughput per worker
+    start = time.perf_counter()
+    results = [validate_game(index, record) for index, record in chunk]
+    return os.getpid(), time.perf_counter() - start, results
+
+
+def read_done(path):
+    # Game indices already in the output of an interrupted run. A line cut
+    # short by a crash is dropped from the file so appending continues on
+    # a fresh line.
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'rb+') as file:
+        data = file.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            file.truncate(end)
+    for line in data[:end].splitlines():
+        try:
+            done.add(json.loads(line)['index'])
+        except (ValueError, KeyError):
+            continue
+    return done
+
+def chunks(games, size, done, limit=None):
+    # (index, PgnGame) lists of up to `size` games not yet in the output
+    chunk = []
+    for index, record in enumerate(games):
+        if limit is not None and index >= limit:
+            break
+        if index in done:
+            continue
+        chunk.append((index, record))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class WorkerStats:
+    def __init__(self):
+        self.chunks = 0
+        self.games = 0
+        self.plies = 0
+        self.busy = 0.0
+
+
+def run(args):
+    done = read_done(args.output) if args.resume else set()
+    stats = {}
+    totals = {'games': 0, 'illegal': 0, 'mismatched': 0}
+    start = last_progress = time.perf_counter()
+
+    with open(args.output, 'a' if args.resume else 'w', encoding='utf-8') as output, \
+            ProcessPoolExecutor(args.workers, initializer=init_worker,
+                                initargs=(args.backend, args.depth, args.hash)) as pool:
+        pending = set()
+        work = chunks(read_games(args.archive, args.mmap), args.chunk, done, args.limit)
+        exhausted = False
+        while pending or not exhausted:
+            # Keep the pool fed, reading the archive only as far as needed
+            while not exhausted and len(pending) < args.workers * CHUNKS_IN_FLIGHT:
+                chunk = next(work, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    pending.add(pool.submit(validate_chunk, chunk))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                pid, busy, results = future.result()
+                worker = stats.setdefault(pid, WorkerStats())
+                worker.chunks += 1
+                worker.busy += busy
+                for result in results:
+                    output.write(json.dumps(result) + '\n')
+                    worker.games += 1
+                    worker.plies += result['plies']
+                    totals['games'] += 1
+                    totals['illegal'] += not result['legal']
+                    totals['mismatched'] += result.get('result_ok') is False
+                # A chunk is on disk before the next one is waited for, so
+                # --resume loses at most the chunks in flight
+                output.flush()
+
+            now = time.perf_counter()
+            if now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                print(f"{totals['games']} games, {totals['games'] / (now - start):.1f} games/s", file=sys.stderr)
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    if done:
+        print(f"skipped {len(done)} games already in {args.output}")
+    print(f"{totals['games']} games in {elapsed:.2f}s ({totals['games'] / elapsed:.1f} games/s): "
+          f"{totals['illegal']} with illegal moves, {totals['mismatched']} with a wrong result")
+    for pid, worker in sorted(stats.items()):
+        print(f"worker {pid}: {worker.chunks:5} chunks {worker.games:8} games {worker.plies:10} plies "
+              f"{worker.busy:8.2f}s busy {worker.games / max(worker.busy, 1e-9):8.1f} games/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay, check and adjudicate the games of a PGN archive")
+    parser.add_argument('archive')
+    parser.add_argument('-o', '--output', help="JSONL results (default: the archive name with .jsonl)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk', type=int, default=64, help="games per task")
+    parser.add_argument('--resume', action='store_true', help="skip the games already in the output")
+    parser.add_argument('--limit', type=int, help="only the first N games of the archive")
+    parser.add_argument('--depth', type=int, default=0, help="engine search depth for the final position (0: none)")
+    parser.add_argument('--hash', type=int, default=WORKER_HASH_MB, help="transposition table size per worker in MB")
+    parser.add_argument('--backend', choices=sorted(BOARD_BACKENDS), default=BOARD_BACKEND)
+    parser.add_argument('--mmap', action='store_true', help="read the archive through mmap")
+    args = parser.parse_args()
+    if args.output is None:
+        args.output = os.path.splitext(args.archive)[0] + '.jsonl'
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
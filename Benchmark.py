@@ -0,0 +1,225 @@
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from ChessGame import ChessGame, BOARD_BACKENDS
+from Engine import Engine
+from Perft import SUITE, perft
+from Parallel import ParallelSearch
+from Pgn import read_games, write_game
+from Transposition import TranspositionTable
+from config import BOARD_BACKEND
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Each snippet runs in a fresh interpreter and prints how long its imports took
+IMPORT_SNIPPET = """
+import sys, time
+start = time.perf_counter()
+{imports}
+print(time.perf_counter() - start, 'pygame' in sys.modules)
+"""
+
+
+def time_import(imports, runs):
+    timings = []
+    pygame_loaded = False
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1')
+    for _ in range(runs):
+        # -B keeps the runs from writing __pycache__ into the tree
+        output = subprocess.run(
+            [sys.executable, '-B', '-c', IMPORT_SNIPPET.format(imports=imports)],
+            cwd=HERE, env=env, capture_output=True, text=True, check=True,
+        ).stdout.split()
+        timings.append(float(output[0]))
+        pygame_loaded = output[1] == 'True'
+    return statistics.median(timings), pygame_loaded
+
+
+def bench_startup(args):
+    # Cost of importing the rules engine in a worker process, with and
+    # without the pygame view that used to be pulled in by Board
+    core, core_pygame = time_import('import ChessGame', args.runs)
+    full, _ = time_import('import ChessGame, BoardView', args.runs)
+    print(f"core (ChessGame):        {core * 1000:8.2f} ms  pygame loaded: {core_pygame}")
+    print(f"core + view (BoardView): {full * 1000:8.2f} ms")
+    print(f"saved per process:       {(full - core) * 1000:8.2f} ms ({full / core:.1f}x)")
+
+
+def bench_ordering(args):
+    # Nodes needed for the same fixed-depth search with and without move
+    # ordering (the transposition table move is tried first in both)
+    totals = {False: 0, True: 0}
+    for name, fen, _ in SUITE:
+        counts = {}
+        for ordering in (False, True):
+            engine = Engine(ChessGame(fen=fen), TranspositionTable(args.hash), ordering=ordering)
+            result = engine.search(max_depth=args.depth)
+            counts[ordering] = result.nodes
+            totals[ordering] += result.nodes
+        print(f"{name:20} unordered {counts[False]:9} ordered {counts[True]:9} ({counts[True] / counts[False]:.0%})")
+    print(f"{'total':20} unordered {totals[False]:9} ordered {totals[True]:9} ({totals[True] / totals[False]:.0%})")
+
+
+def bench_scaling(args):
+    # Fixed-depth parallel search of the reference positions with a
+    # growing number of worker processes, against the serial engine. The
+    # moves and scores must not change with the worker count. Speedup is
+    # time to depth, so the nodes a split search spends over the serial
+    # one count against it; nps alone would hide them.
+    serial_nodes = 0
+    serial_elapsed = 0.0
+    for _, fen, _ in SUITE:
+        result = Engine(ChessGame(fen=fen), TranspositionTable(args.hash)).search(max_depth=args.depth)
+        serial_nodes += result.nodes
+        serial_elapsed += result.elapsed
+    print(f"    serial: {serial_nodes:9} nodes {serial_elapsed:7.2f}s {serial_nodes / max(serial_elapsed, 1e-9):9.0f} nps")
+
+    baseline = None
+    for workers in args.workers:
+        with ParallelSearch(ChessGame(), workers) as search:
+            # Start the worker processes before timing
+            search.search(max_depth=1)
+            nodes = 0
+            elapsed = 0.0
+            answers = []
+            for _, fen, _ in SUITE:
+                search.game = ChessGame(fen=fen)
+                result = search.search(max_depth=args.depth)
+                nodes += result.nodes
+                elapsed += result.elapsed
+                answers.append((result.move[:2], result.score))
+        if baseline is None:
+            baseline = answers
+        same = 'same' if answers == baseline else 'DIFFERENT'
+        print(f"{workers:2} workers: {nodes:9} nodes {elapsed:7.2f}s {nodes / max(elapsed, 1e-9):9.0f} nps "
+              f"nodes {nodes / max(serial_nodes, 1):5.2f}x serial  speedup {serial_elapsed / max(elapsed, 1e-9):5.2f}x  "
+              f"results {same}")
+
+
+def bench_backend(args):
+    # Move generation, perft and search speed of each board backend on
+    # the reference positions, and the bitboard speedup over the mailbox
+    timings = {}
+    for backend in ('mailbox', 'bitboard'):
+        games = [ChessGame(backend, fen) for _, fen, _ in SUITE]
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            for game in games:
+                game.legal_moves()
+        generate = (time.perf_counter() - start) / (args.runs * len(games))
+
+        start = time.perf_counter()
+        nodes = sum(perft(game, args.perft_depth) for game in games)
+        perft_elapsed = time.perf_counter() - start
+
+        search_nodes = 0
+        search_elapsed = 0.0
+        for _, fen, _ in SUITE:
+            result = Engine(ChessGame(backend, fen), TranspositionTable(args.hash)).search(max_depth=args.depth)
+            search_nodes += result.nodes
+            search_elapsed += result.elapsed
+        timings[backend] = (generate, perft_elapsed, search_elapsed)
+        print(f"{backend:8}: legal_moves {generate * 1e6:7.1f} us  perft {args.perft_depth} {nodes:9} nodes "
+              f"{perft_elapsed:7.2f}s  search depth {args.depth} {search_nodes:8} nodes {search_elapsed:7.2f}s "
+              f"{search_nodes / max(search_elapsed, 1e-9):7.0f} nps")
+    speedups = [mailbox / max(bitboard, 1e-9) for mailbox, bitboard in zip(timings['mailbox'], timings['bitboard'])]
+    print(f"speedup : legal_moves {speedups[0]:5.2f}x  perft {speedups[1]:5.2f}x  search {speedups[2]:5.2f}x")
+
+
+def write_sample_archive(path, games, seed=0):
+    # Random legal games, so the archive exercises every kind of move
+    # (captures, castling, en passant, promotion) without shipping a file
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as file:
+        for number in range(games):
+            game = ChessGame()
+            for _ in range(rng.randint(20, 160)):
+                moves = game.legal_moves()
+                if not moves or game.status().is_over:
+                    break
+                game.make_move(*rng.choice(moves))
+            write_game(file, game, {'Event': 'Sample', 'Round': number + 1})
+
+
+def bench_pgn(args):
+    # Games per second for reading an archive (tags and SAN only) and for
+    # replaying every move through ChessGame, from a file and from an mmap
+    path = args.file
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), 'sample.pgn')
+        start = time.perf_counter()
+        write_sample_archive(path, args.games)
+        print(f"wrote {args.games} random games to {path} in {time.perf_counter() - start:.2f}s")
+    size = os.path.getsize(path)
+    try:
+        for use_mmap in (False, True):
+            source = 'mmap' if use_mmap else 'file'
+            start = time.perf_counter()
+            games = sum(1 for _ in read_games(path, use_mmap))
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            print(f"read   ({source:4}): {games:7} games {elapsed:7.2f}s {games / elapsed:9.1f} games/s "
+                  f"{size / elapsed / 2 ** 20:7.2f} MB/s")
+
+            start = time.perf_counter()
+            games = plies = errors = 0
+            for record in read_games(path, use_mmap):
+                try:
+                    record.replay(args.backend)
+                except ValueError:
+                    errors += 1
+                games += 1
+                plies += len(record.moves)
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            print(f"replay ({source:4}): {games:7} games {elapsed:7.2f}s {games / elapsed:9.1f} games/s "
+                  f"{plies / elapsed:9.0f} plies/s  errors {errors}")
+    finally:
+        if args.file is None:
+            os.remove(path)
+            os.rmdir(os.path.dirname(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chess benchmarks")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    startup = subparsers.add_parser('startup', help="import time of the headless core")
+    startup.add_argument('--runs', type=int, default=20)
+    startup.set_defaults(func=bench_startup)
+
+    ordering = subparsers.add_parser('ordering', help="search nodes with and without move ordering")
+    ordering.add_argument('--depth', type=int, default=4)
+    ordering.add_argument('--hash', type=int, default=16, help="transposition table size in MB")
+    ordering.set_defaults(func=bench_ordering)
+
+    scaling = subparsers.add_parser('scaling', help="parallel search time to depth by number of worker processes")
+    scaling.add_argument('--depth', type=int, default=4)
+    scaling.add_argument('--hash', type=int, default=16, help="transposition table size in MB of the serial engine")
+    scaling.add_argument('--workers', type=lambda text: [int(n) for n in text.split(',')], default=[1, 2, 4, 8],
+                         help="comma-separated worker counts")
+    scaling.set_defaults(func=bench_scaling)
+
+    backend = subparsers.add_parser('backend', help="mailbox against bitboard move generation and search speed")
+    backend.add_argument('--runs', type=int, default=200, help="legal_moves calls per position")
+    backend.add_argument('--perft-depth', type=int, default=3)
+    backend.add_argument('--depth', type=int, default=3, help="search depth")
+    backend.add_argument('--hash', type=int, default=16, help="transposition table size in MB")
+    backend.set_defaults(func=bench_backend)
+
+    pgn = subparsers.add_parser('pgn', help="PGN reading and replay speed in games per second")
+    pgn.add_argument('file', nargs='?', help="PGN archive (default: a generated sample)")
+    pgn.add_argument('--games', type=int, default=200, help="games in the generated sample")
+    pgn.add_argument('--backend', choices=sorted(BOARD_BACKENDS), default=BOARD_BACKEND)
+    pgn.set_defaults(func=bench_pgn)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+from Board import Board, PROMOTION_PIECES, CASTLING_SQUARES
+from Piece import SQUARES, KNIGHT_OFFSETS, KING_OFFSETS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS
+
+# Squares are numbered row * 8 + col, so bit 0 is a8 and bit 63 is h1
+COLORS = ('white', 'black')
+PIECE_NAMES = ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+ALL_SQUARES = (1 << 64) - 1
+
+
+def position(sq):
+    return divmod(sq, 8)
+
+def popcount(bitboard):
+    return bitboard.bit_count()
+
+def iter_squares(bitboard):
+    while bitboard:
+        low = bitboard & -bitboard
+        yield low.bit_length() - 1
+        bitboard ^= low
+
+
+def _leaper_table(offsets):
+    table = []
+    for sq in range(64):
+        row, col = position(sq)
+        mask = 0
+        for d_row, d_col in offsets:
+            r, c = row + d_row, col + d_col
+            if 0 <= r < 8 and 0 <= c < 8:
+                mask |= 1 << (r * 8 + c)
+        table.append(mask)
+    return table
+
+def _ray_table(d_row, d_col):
+    table = []
+    for sq in range(64):
+        row, col = position(sq)
+        mask = 0
+        r, c = row + d_row, col + d_col
+        while 0 <= r < 8 and 0 <= c < 8:
+            mask |= 1 << (r * 8 + c)
+            r += d_row
+            c += d_col
+        table.append(mask)
+    return table
+
+KNIGHT_ATTACKS = _leaper_table(KNIGHT_OFFSETS)
+KING_ATTACKS = _leaper_table(KING_OFFSETS)
+# Squares attacked by a pawn of the given color standing on each square
+PAWN_ATTACKS = {
+    'white': _leaper_table(((-1, -1), (-1, 1))),
+    'black': _leaper_table(((1, -1), (1, 1))),
+}
+
+# (ray table, True if the ray runs towards higher square numbers)
+ROOK_RAYS = [(_ray_table(d_row, d_col), d_row * 8 + d_col > 0) for d_row, d_col in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(_ray_table(d_row, d_col), d_row * 8 + d_col > 0) for d_row, d_col in BISHOP_DIRECTIONS]
+
+
+def _between_table():
+    # For two squares on a common rank, file or diagonal, the squares
+    # strictly between them; 0 for any other pair
+    table = [[0] * 64 for _ in range(64)]
+    for table_rays in (ROOK_RAYS, BISHOP_RAYS):
+        for rays, _ in table_rays:
+            for sq in range(64):
+                for target in iter_squares(rays[sq]):
+                    table[sq][target] = rays[sq] & ~rays[target] & ~(1 << target)
+    return table
+
+BETWEEN_MASKS = _between_table()
+
+
+def _square_rays(rays):
+    # Per square, the rays running towards higher and towards lower square
+    # numbers as (ray, ray table) pairs, leaving out empty rays
+    return [(tuple((table[sq], table) for table, positive in rays if positive and table[sq]),
+             tuple((table[sq], table) for table, positive in rays if not positive and table[sq]))
+            for sq in range(64)]
+
+ROOK_SQUARE_RAYS = _square_rays(ROOK_RAYS)
+BISHOP_SQUARE_RAYS = _square_rays(BISHOP_RAYS)
+QUEEN_SQUARE_RAYS = _square_rays(ROOK_RAYS + BISHOP_RAYS)
+
+
+def _slider_attacks(sq, occupied, square_rays):
+    # The nearest blocker is the lowest bit on rays towards higher square
+    # numbers and the highest on the others; everything beyond it is cut
+    # off
+    towards_higher, towards_lower = square_rays[sq]
+    attacks = 0
+    for ray, table in towards_higher:
+        blockers = ray & occupied
+        if blockers:
+            ray ^= table[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for ray, table in towards_lower:
+        blockers = ray & occupied
+        if blockers:
+            ray ^= table[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+def _slider_hits(sq, occupied, rays, sliders):
+    # True if the nearest blocker on some ray from `sq` is one of `sliders`.
+    # Rays without a slider on them are skipped without a bit scan.
+    for table, positive in rays:
+        ray = table[sq]
+        if ray & sliders:
+            blockers = ray & occupied
+            if positive:
+                nearest = blockers & -blockers
+            else:
+                nearest = 1 << (blockers.bit_length() - 1)
+            if nearest & sliders:
+                return True
+    return False
+
+def rook_attacks(sq, occupied):
+    return _slider_attacks(sq, occupied, ROOK_SQUARE_RAYS)
+
+def bishop_attacks(sq, occupied):
+    return _slider_attacks(sq, occupied, BISHOP_SQUARE_RAYS)
+
+def queen_attacks(sq, occupied):
+    return _slider_attacks(sq, occupied, QUEEN_SQUARE_RAYS)
+
+# Move generation order after the pawns, with each piece's attack set
+# (None for the knight's table lookup)
+PIECE_ATTACKS = (('knight', None), ('bishop', bishop_attacks), ('rook', rook_attacks), ('queen', queen_attacks))
+# Squares a pawn of each color promotes on, and the pieces it may become
+PROMOTION_RANKS = {'white': 0xFF, 'black': 0xFF << 56}
+PROMOTIONS = {color: tuple(piece_type(color) for piece_type in PROMOTION_PIECES) for color in COLORS}
+# Pawns one push away from their double-push square, and the files a
+# capture to the left or right cannot come from
+DOUBLE_PUSH_RANKS = {'white': 0xFF << 40, 'black': 0xFF << 16}
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+# Per color: (right, king square, squares that must be empty, square the
+# king passes, square it lands on) of each castling move
+CASTLING_PATHS = {color: [] for color in COLORS}
+for _right, (_king_row, _king_col), (_rook_row, _rook_col) in CASTLING_SQUARES:
+    _step = 1 if _rook_col > _king_col else -1
+    _path = 0
+    for _col in range(_king_col + _step, _rook_col, _step):
+        _path |= 1 << (_king_row * 8 + _col)
+    CASTLING_PATHS['white' if _king_row == 7 else 'black'].append(
+        (_right, _king_row * 8 + _king_col, _path, _king_row * 8 + _king_col + _step, _king_row * 8 + _king_col + 2 * _step))
+
+
+def _add_pawn_moves(append, ends, offset, last_rank, promoted):
+    # Appends a move to every square in `ends` from `offset` squares away
+    while ends:
+        end = ends & -ends
+        ends ^= end
+        sq = end.bit_length() - 1
+        if end & last_rank:
+            for piece in promoted:
+                append((SQUARES[sq + offset], SQUARES[sq], piece))
+        else:
+            append((SQUARES[sq + offset], SQUARES[sq], None))
+
+
+class BitboardBoard(Board):
+    # Board that mirrors the mailbox in one bitboard per piece type and color.
+    # The Piece objects in self.board stay the source of truth for the
+    # Piece.is_valid_move API; queries that would scan all 64 squares are
+    # answered with integer operations instead.
+
+    def __init__(self):
+        self.bitboards = {color: dict.fromkeys(PIECE_NAMES, 0) for color in COLORS}
+        self.occupancy = dict.fromkeys(COLORS, 0)
+        super().__init__()
+
+    @property
+    def occupied(self):
+        return self.occupancy['white'] | self.occupancy['black']
+
+    def set_piece(self, pos, piece):
+        mask = 1 << (pos[0] * 8 + pos[1])
+        old = self.board[pos[0]][pos[1]]
+        if old is not None:
+            self.bitboards[old.color][old.name] &= ~mask
+            self.occupancy[old.color] &= ~mask
+        if piece is not None:
+            self.bitboards[piece.color][piece.name] |= mask
+            self.occupancy[piece.color] |= mask
+        super().set_piece(pos, piece)
+
+    def count_pieces(self, color, piece_type=None):
+        if piece_type is None:
+            return popcount(self.occupancy[color])
+        return popcount(self.bitboards[color][piece_type.name])
+
+    def attackers_to(self, sq, color, occupied=None):
+        # Bitboard of the pieces of `color` attacking square number `sq`
+        if occupied is None:
+            occupied = self.occupied
+        pieces = self.bitboards[color]
+        other = 'black' if color == 'white' else 'white'
+        queens = pieces['queen']
+        return ((PAWN_ATTACKS[other][sq] & pieces['pawn'])
+                | (KNIGHT_ATTACKS[sq] & pieces['knight'])
+                | (KING_ATTACKS[sq] & pieces['king'])
+                | (rook_attacks(sq, occupied) & (pieces['rook'] | queens))
+                | (bishop_attacks(sq, occupied) & (pieces['bishop'] | queens)))
+
+    def is_attacked_by(self, pos, color, ignore=None):
+        occupied = self.occupancy['white'] | self.occupancy['black']
+        if ignore is not None:
+            occupied &= ~(1 << (ignore[0] * 8 + ignore[1]))
+        return self.attacked_at(pos[0] * 8 + pos[1], color, occupied)
+
+    def attacked_at(self, sq, color, occupied):
+        # True if a piece of `color` attacks square number `sq`, with
+        # sliders blocked only by the pieces in `occupied`
+        pieces = self.bitboards[color]
+        if (KNIGHT_ATTACKS[sq] & pieces['knight']
+                or PAWN_ATTACKS['black' if color == 'white' else 'white'][sq] & pieces['pawn']
+                or KING_ATTACKS[sq] & pieces['king']):
+            return True
+        queens = pieces['queen']
+        return (_slider_hits(sq, occupied, ROOK_RAYS, pieces['rook'] | queens)
+                or _slider_hits(sq, occupied, BISHOP_RAYS, pieces['bishop'] | queens))
+
+    def checkers_and_pins(self, color):
+        # Square number of the king of `color`, the bitboard of the pieces
+        # giving it check and, for every pinned piece by square number, the
+        # squares it may still move to: the line up to and including the
+        # pinning piece
+        king = self.king_squares[color]
+        if king is None:
+            return None, 0, {}
+        k = king[0] * 8 + king[1]
+        enemy = self.bitboards['black' if color == 'white' else 'white']
+        them = self.occupancy['black' if color == 'white' else 'white']
+        occupied = self.occupancy[color] | them
+        rooks = enemy['rook'] | enemy['queen']
+        bishops = enemy['bishop'] | enemy['queen']
+        checkers = ((KNIGHT_ATTACKS[k] & enemy['knight'])
+                    | (PAWN_ATTACKS[color][k] & enemy['pawn'])
+                    | (rook_attacks(k, occupied) & rooks)
+                    | (bishop_attacks(k, occupied) & bishops))
+
+        # Sliders that would attack the king if its own side's pieces were
+        # gone pin the piece between them when it is the only one there
+        pins = {}
+        between = BETWEEN_MASKS[k]
+        for sniper in iter_squares((rook_attacks(k, them) & rooks) | (bishop_attacks(k, them) & bishops)):
+            blockers = between[sniper] & occupied
+            if blockers and not blockers & (blockers - 1):
+                pins[blockers.bit_length() - 1] = between[sniper] | 1 << sniper
+        return k, checkers, pins
+
+    def legal_moves(self, color):
+        return self.collect_moves(color, None, True)
+
+    def generate_legal_moves(self, color, start_pos=None):
+        return [(start, end) for start, end, _ in self.collect_moves(color, start_pos, False)]
+
+    def collect_moves(self, color, start_pos, promotions):
+        # Board.legal_moves worked out on the bitboards, as a list of
+        # (start, end, promotion). Each piece's targets are one attack
+        # set, cut down to the evasion squares in check and to the pin line
+        # of a pinned piece. Without `promotions` a promotion is listed
+        # once, with None.
+        other = 'black' if color == 'white' else 'white'
+        pieces = self.bitboards[color]
+        own = self.occupancy[color]
+        them = self.occupancy[other]
+        occupied = own | them
+        empty = ~occupied & ALL_SQUARES
+        only = ALL_SQUARES if start_pos is None else 1 << (start_pos[0] * 8 + start_pos[1])
+        king, checkers, pins = self.checkers_and_pins(color)
+        moves = []
+        append = moves.append
+
+        # In double check only the king can move
+        if not checkers & (checkers - 1):
+            targets = ~own & ALL_SQUARES
+            if checkers:
+                targets &= BETWEEN_MASKS[king][checkers.bit_length() - 1] | checkers
+
+            pawns = pieces['pawn'] & only
+            last_rank = PROMOTION_RANKS[color]
+            promoted = PROMOTIONS[color] if promotions else (None,)
+            # Pawns that are not pinned move as a set, one shift per kind of
+            # move
+            free = pawns
+            for sq in pins:
+                free &= ~(1 << sq)
+            if color == 'white':
+                push = free >> 8 & empty
+                _add_pawn_moves(append, push & targets, 8, last_rank, promoted)
+                _add_pawn_moves(append, (push & DOUBLE_PUSH_RANKS[color]) >> 8 & empty & targets, 16, last_rank, promoted)
+                _add_pawn_moves(append, (free & ~FILE_A) >> 9 & them & targets, 9, last_rank, promoted)
+                _add_pawn_moves(append, (free & ~FILE_H) >> 7 & them & targets, 7, last_rank, promoted)
+            else:
+                push = free << 8 & empty
+                _add_pawn_moves(append, push & targets, -8, last_rank, promoted)
+                _add_pawn_moves(append, (push & DOUBLE_PUSH_RANKS[color]) << 8 & empty & targets, -16, last_rank, promoted)
+                _add_pawn_moves(append, (free & ~FILE_A) << 7 & them & targets, -7, last_rank, promoted)
+                _add_pawn_moves(append, (free & ~FILE_H) << 9 & them & targets, -9, last_rank, promoted)
+
+            # Pinned pawns one at a time, within their pin line
+            pawn_attacks = PAWN_ATTACKS[color]
+            for sq, pin in pins.items():
+                low = 1 << sq
+                if not pawns & low:
+                    continue
+                if color == 'white':
+                    push = low >> 8 & empty
+                    if push and 48 <= sq < 56:
+                        push |= push >> 8 & empty
+                else:
+                    push = low << 8 & empty
+                    if push and 8 <= sq < 16:
+                        push |= push << 8 & empty
+                ends = (push | pawn_attacks[sq] & them) & targets & pin
+                while ends:
+                    end = ends & -ends
+                    ends ^= end
+                    end = end.bit_length() - 1
+                    _add_pawn_moves(append, 1 << end, sq - end, last_rank, promoted)
+
+            # En passant removes two pieces from the capturing rank, which
+            # can expose the king in ways the pin masks miss, so every
+            # capture is tried on the board
+            en_passant = self.en_passant_target
+            if en_passant is not None:
+                capturers = PAWN_ATTACKS[other][en_passant[0] * 8 + en_passant[1]] & pawns
+                while capturers:
+                    low = capturers & -capturers
+                    capturers ^= low
+                    start = SQUARES[low.bit_length() - 1]
+                    if self.is_legal_en_passant(start, en_passant):
+                        append((start, en_passant, None))
+
+            for name, attacks in PIECE_ATTACKS:
+                movers = pieces[name] & only
+                while movers:
+                    low = movers & -movers
+                    movers ^= low
+                    sq = low.bit_length() - 1
+                    targets_here = (KNIGHT_ATTACKS[sq] if attacks is None else attacks(sq, occupied)) & targets
+                    if sq in pins:
+                        targets_here &= pins[sq]
+                    start = SQUARES[sq]
+                    while targets_here:
+                        end = targets_here & -targets_here
+                        targets_here ^= end
+                        append((start, SQUARES[end.bit_length() - 1], None))
+
+        if king is not None and only >> king & 1:
+            start = SQUARES[king]
+            targets_here = KING_ATTACKS[king] & ~own
+            # The king itself must not block a slider's ray to the square
+            # it steps back to
+            without_king = occupied ^ (1 << king)
+            while targets_here:
+                end = targets_here & -targets_here
+                targets_here ^= end
+                end = end.bit_length() - 1
+                if not self.attacked_at(end, other, without_king):
+                    append((start, SQUARES[end], None))
+            # Castling: not out of, through or into check
+            if not checkers and self.castling:
+                for right, home, path, passed, end in CASTLING_PATHS[color]:
+                    if (self.castling & right and king == home and not occupied & path
+                            and not self.attacked_at(passed, other, occupied)
+                            and not self.attacked_at(end, other, occupied)):
+                        append((start, SQUARES[end], None))
+        return moves
+
+    def attackers(self, pos, color, removed=()):
+        occupied = self.occupancy['white'] | self.occupancy['black']
+        for row, col in removed:
+            occupied &= ~(1 << (row * 8 + col))
+        return [position(sq) for sq in iter_squares(self.attackers_to(pos[0] * 8 + pos[1], color, occupied) & occupied)]
@@ -1,186 +1,544 @@
-import pygame
-from Piece import Pawn, Rook, Knight, Bishop, Queen, King
+from Piece import Pawn, Rook, Knight, Bishop, Queen, King, SQUARES, PAWN_TARGETS, KNIGHT_TARGETS, KING_TARGETS, STRAIGHT_RAYS, DIAGONAL_RAYS, PIECE_VALUES
+from Zobrist import PIECE_KEYS, BLACK_TO_MOVE, CASTLING_KEYS, EN_PASSANT_KEYS
+from Move import Move
 
 
-WHITE = (255, 255, 255)
-GRAY = (128, 128, 128)
+# Castling rights bits
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+FEN_SYMBOLS = {'pawn': 'p', 'knight': 'n', 'bishop': 'b', 'rook': 'r', 'queen': 'q', 'king': 'k'}
+PROMOTION_PIECES = (Queen, Rook, Bishop, Knight)
+FEN_PIECES = {'p': Pawn, 'n': Knight, 'b': Bishop, 'r': Rook, 'q': Queen, 'k': King}
+FEN_CASTLING = ((WHITE_KINGSIDE, 'K'), (WHITE_QUEENSIDE, 'Q'), (BLACK_KINGSIDE, 'k'), (BLACK_QUEENSIDE, 'q'))
+FEN_RIGHTS = {letter: right for right, letter in FEN_CASTLING}
+
+# (right, king square, rook square)
+CASTLING_SQUARES = (
+    (WHITE_KINGSIDE, (7, 4), (7, 7)),
+    (WHITE_QUEENSIDE, (7, 4), (7, 0)),
+    (BLACK_KINGSIDE, (0, 4), (0, 7)),
+    (BLACK_QUEENSIDE, (0, 4), (0, 0)),
+)
+
+# Castling rights that survive a move from or to each square
+CASTLING_MASKS = [[15] * 8 for _ in range(8)]
+for _right, (_king_row, _king_col), (_rook_row, _rook_col) in CASTLING_SQUARES:
+    CASTLING_MASKS[_king_row][_king_col] &= ~_right
+    CASTLING_MASKS[_rook_row][_rook_col] &= ~_right
+
 class Board:
 
     def __init__(self):
         self.board = [[None for _ in range(8)] for _ in range(8)]
+        self.hash = 0
+        # Material (in PIECE_VALUES) and number of pieces of each kind per
+        # color, kept up to date by set_piece
+        self.material = {'white': 0, 'black': 0}
+        self.piece_counts = {color: dict.fromkeys(PIECE_VALUES, 0) for color in ('white', 'black')}
+        # Pieces taken in the moves played, in order
+        self.captured = []
+        # Square of each king, kept up to date by set_piece
+        self.king_squares = {'white': None, 'black': None}
         self.setup_pieces()
         self.move_history = []
         self.redo_stack = []
 
-    def draw_board(self, window, square_size, flipped=False):
-        colors = [WHITE, GRAY]
-        for row in range(8):
-            for col in range(8):
-                color = colors[(row + col) % 2]
-                if flipped:
-                    pygame.draw.rect(window, color, ((7 - col) * square_size, (7 - row) * square_size, square_size, square_size))
-                else:
-                    pygame.draw.rect(window, color, (col * square_size, row * square_size, square_size, square_size))
-
-    def draw_pieces(self, window, IMAGES, square_size, flipped=False):
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece:
-                    piece_name = f"{piece.color}_{piece.__class__.__name__.lower()}"
-                    if flipped:
-                        window.blit(IMAGES[piece_name], ((7 - col) * square_size, (7 - row) * square_size))
-                    else:
-                        window.blit(IMAGES[piece_name], (col * square_size, row * square_size))
-    
-    def promotion_pieces(self, window, IMAGES, square_size, color, option, col, row, flipped=False):
-        image = pygame.transform.scale(IMAGES[f"{color}_{option['name']}"], (square_size, square_size))
-        if (color == 'black' and not flipped) or (color == 'white' and flipped):
-            pygame.draw.rect(window, (203, 203, 203),
-                             (col * square_size, (7 - row) * square_size, square_size, square_size))
-            window.blit(image, (col * square_size, (7 - row) * square_size))
-            option['properties'] = (7 - row, col)
-        else:
-            pygame.draw.rect(window, (203, 203, 203),
-                             (col * square_size, row * square_size, square_size, square_size))
-            window.blit(image, (col * square_size, row * square_size))
-            option['properties'] = (row, col)
+        self.turn = 'white'
+        self.en_passant_target = None
+        self.en_passant_key = 0
+        # Halfmoves since the last capture or pawn move, for the fifty-move rule
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.castling = self.castling_rights()
+        self.hash ^= CASTLING_KEYS[self.castling]
+        # Number of times each position hash has occurred in the game
+        self.position_counts = {self.hash: 1}
 
     def setup_pieces(self):
         # Add pawns
         for i in range(8):
-            self.board[1][i] = Pawn('black')
-            self.board[6][i] = Pawn('white')
+            self.set_piece((1, i), Pawn('black'))
+            self.set_piece((6, i), Pawn('white'))
         
         # Add other pieces (rooks, knights, bishops, etc.)
         placements = [Rook, Knight, Bishop, Queen, King, Bishop, Knight, Rook]
         for i, piece in enumerate(placements):
-            self.board[0][i] = piece('black')
-            self.board[7][i] = piece('white')
+            self.set_piece((0, i), piece('black'))
+            self.set_piece((7, i), piece('white'))
+
+    def set_piece(self, pos, piece):
+        # Every change to the position goes through here so that other
+        # backends can keep their own representation in sync
+        row, col = pos
+        old = self.board[row][col]
+        if old is not None:
+            self.hash ^= PIECE_KEYS[old.color, old.name][row * 8 + col]
+            self.material[old.color] -= PIECE_VALUES[old.name]
+            self.piece_counts[old.color][old.name] -= 1
+            if old.name == 'king' and self.king_squares[old.color] == pos:
+                self.king_squares[old.color] = None
+        if piece is not None:
+            self.hash ^= PIECE_KEYS[piece.color, piece.name][row * 8 + col]
+            self.material[piece.color] += PIECE_VALUES[piece.name]
+            self.piece_counts[piece.color][piece.name] += 1
+            if piece.name == 'king':
+                self.king_squares[piece.color] = pos
+        self.board[row][col] = piece
+
+    @property
+    def material_balance(self):
+        # Material difference from white's point of view
+        return self.material['white'] - self.material['black']
+
+    def castling_rights(self, rights=15):
+        # The castling rights among `rights` whose king and rook stand on
+        # their starting squares
+        for right, (king_row, king_col), (rook_row, rook_col) in CASTLING_SQUARES:
+            king = self.board[king_row][king_col]
+            rook = self.board[rook_row][rook_col]
+            color = 'white' if king_row == 7 else 'black'
+            if not (isinstance(king, King) and king.color == color and isinstance(rook, Rook) and rook.color == color):
+                rights &= ~right
+        return rights
+
+    def castling_moves(self, color):
+        # Squares the king of `color` can castle to by its castling rights
+        # and the empty squares between it and the rook; whether it passes
+        # through check is decided by ChessGame
+        for right, (king_row, king_col), (rook_row, rook_col) in CASTLING_SQUARES:
+            if self.castling & right and (king_row == 7) == (color == 'white'):
+                step = 1 if rook_col > king_col else -1
+                if all(self.board[king_row][col] is None for col in range(king_col + step, rook_col, step)):
+                    yield (king_row, king_col + 2 * step)
+
+    def switch_turn(self):
+        self.turn = 'black' if self.turn == 'white' else 'white'
+        self.hash ^= BLACK_TO_MOVE
+
+    def set_en_passant_target(self, target):
+        # The en passant file only becomes part of the hash when a pawn of
+        # the side to move can legally make the capture, so positions that
+        # only differ by an unusable en passant square still repeat
+        self.hash ^= self.en_passant_key
+        self.en_passant_target = target
+        self.en_passant_key = 0
+        if target is not None and self.en_passant_capturable(target):
+            self.en_passant_key = EN_PASSANT_KEYS[target[1]]
+        self.hash ^= self.en_passant_key
+
+    def en_passant_capturable(self, target):
+        pawn_row = 4 if target[0] == 5 else 3
+        for col in (target[1] - 1, target[1] + 1):
+            if 0 <= col < 8:
+                piece = self.board[pawn_row][col]
+                if isinstance(piece, Pawn) and piece.color == self.turn and self.is_legal_en_passant((pawn_row, col), target):
+                    return True
+        return False
+
+    def is_legal_en_passant(self, start, end):
+        # En passant takes two pawns off the capturing rank at once, which
+        # can expose the king in ways a pin scan misses, so the capture is
+        # tried on the board and taken back
+        captured_pos = (start[0], end[1])
+        pawn = self.board[start[0]][start[1]]
+        captured_pawn = self.board[captured_pos[0]][captured_pos[1]]
+
+        self.set_piece(captured_pos, None)
+        self.set_piece(start, None)
+        self.set_piece(end, pawn)
+        king = self.king_squares[pawn.color]
+        in_check = king is not None and self.is_attacked_by(king, 'black' if pawn.color == 'white' else 'white')
+        self.set_piece(end, None)
+        self.set_piece(start, pawn)
+        self.set_piece(captured_pos, captured_pawn)
+        return not in_check
+
+    def checks_and_pins(self, color):
+        # For the king of `color` returns its position, one set of squares per
+        # checking piece (the checker and the squares between it and the
+        # king: a move to one of them resolves that check) and, for every
+        # pinned piece, the squares it may still move to along the pin.
+        board = self.board
+        king_pos = self.find_king(color)
+        checks = []
+        pins = {}
+        if king_pos is None:
+            return king_pos, checks, pins
+        king_row, king_col = king_pos
+
+        for rays, slider in ((STRAIGHT_RAYS[king_pos], Rook), (DIAGONAL_RAYS[king_pos], Bishop)):
+            for ray in rays:
+                pinned = None
+                for i, square in enumerate(ray):
+                    piece = board[square[0]][square[1]]
+                    if piece is not None:
+                        if piece.color == color:
+                            if pinned is not None:
+                                break
+                            pinned = square
+                        else:
+                            if isinstance(piece, (slider, Queen)):
+                                if pinned is None:
+                                    checks.append(set(ray[:i + 1]))
+                                else:
+                                    pins[pinned] = set(ray[:i + 1])
+                            break
+
+        for r, c in KNIGHT_TARGETS[king_pos]:
+            piece = board[r][c]
+            if isinstance(piece, Knight) and piece.color != color:
+                checks.append({(r, c)})
+
+        pawn_row = king_row - 1 if color == 'white' else king_row + 1
+        if 0 <= pawn_row < 8:
+            for c in (king_col - 1, king_col + 1):
+                if 0 <= c < 8:
+                    piece = board[pawn_row][c]
+                    if isinstance(piece, Pawn) and piece.color != color:
+                        checks.append({(pawn_row, c)})
+
+        return king_pos, checks, pins
+
+    def generate_legal_moves(self, color, start_pos=None):
+        # Yields (start, end) for every legal move of `color`, or only for the
+        # piece on `start_pos`. Checks and pins are worked out once, so no
+        # move has to be played and taken back to test it.
+        board = self.board
+        opponent = 'black' if color == 'white' else 'white'
+        en_passant_target = self.en_passant_target
+        king_pos, checks, pins = self.checks_and_pins(color)
+        evasions = checks[0] if len(checks) == 1 else None
+
+        if start_pos is None:
+            squares = SQUARES
+        else:
+            squares = [start_pos]
+
+        for start in squares:
+            piece = board[start[0]][start[1]]
+            if piece is None or piece.color != color:
+                continue
+
+            if start == king_pos:
+                for end in piece.generate_moves(start, board):
+                    if not self.is_attacked_by(end, opponent, ignore=start):
+                        yield start, end
+                # Castling: not out of, through or into check
+                if not checks:
+                    for end in self.castling_moves(color):
+                        step = 1 if end[1] > start[1] else -1
+                        if not (self.is_attacked_by((start[0], start[1] + step), opponent)
+                                or self.is_attacked_by(end, opponent)):
+                            yield start, end
+                continue
+
+            # In double check only the king can move
+            if len(checks) > 1:
+                continue
+
+            pin = pins.get(start)
+            for end in piece.generate_moves(start, board, en_passant_target):
+                if end == en_passant_target and isinstance(piece, Pawn) and end[1] != start[1]:
+                    # En passant removes two pieces from the capturing rank,
+                    # which can expose the king in ways the pin scan misses
+                    if self.is_legal_en_passant(start, end):
+                        yield start, end
+                    continue
+                if pin is not None and end not in pin:
+                    continue
+                if evasions is not None and end not in evasions:
+                    continue
+                yield start, end
+
+    def legal_moves(self, color):
+        # All legal moves of `color` as (start, end, promotion), with one
+        # entry per promotion piece
+        board = self.board
+        moves = []
+        for start, end in self.generate_legal_moves(color):
+            piece = board[start[0]][start[1]]
+            if isinstance(piece, Pawn) and (end[0] == 0 or end[0] == 7):
+                for piece_type in PROMOTION_PIECES:
+                    moves.append((start, end, piece_type(piece.color)))
+            else:
+                moves.append((start, end, None))
+        return moves
+
+    def find_king(self, color):
+        return self.king_squares[color]
+
+    def count_pieces(self, color, piece_type=None):
+        counts = self.piece_counts[color]
+        return sum(counts.values()) if piece_type is None else counts[piece_type.name]
+
+    def is_attacked_by(self, pos, color, ignore=None):
+        # True if any piece of `color` attacks the square at `pos`. Sliders
+        # see through the `ignore` square, which is how a king stepping
+        # away along a checking ray is caught.
+        board = self.board
+
+        # Pawns attack diagonally towards the opponent
+        for r, c in PAWN_TARGETS['black' if color == 'white' else 'white'][pos]:
+            piece = board[r][c]
+            if isinstance(piece, Pawn) and piece.color == color:
+                return True
+
+        for targets, piece_type in ((KNIGHT_TARGETS[pos], Knight), (KING_TARGETS[pos], King)):
+            for r, c in targets:
+                piece = board[r][c]
+                if isinstance(piece, piece_type) and piece.color == color:
+                    return True
+
+        for rays, slider in ((STRAIGHT_RAYS[pos], Rook), (DIAGONAL_RAYS[pos], Bishop)):
+            for ray in rays:
+                for square in ray:
+                    piece = board[square[0]][square[1]]
+                    if piece is not None and square != ignore:
+                        if piece.color == color and isinstance(piece, (slider, Queen)):
+                            return True
+                        break
+        return False
 
-    def move_piece(self, start_pos, end_pos):
+    def attackers(self, pos, color, removed=()):
+        # Positions of the pieces of `color` attacking `pos`. Pieces on the
+        # `removed` squares are treated as gone, so sliders behind them are
+        # found too (used by static exchange evaluation).
+        row, col = pos
+        board = self.board
+        found = []
+
+        pawn_row = row + 1 if color == 'white' else row - 1
+        if 0 <= pawn_row < 8:
+            for pawn_col in (col - 1, col + 1):
+                if 0 <= pawn_col < 8 and (pawn_row, pawn_col) not in removed:
+                    piece = board[pawn_row][pawn_col]
+                    if isinstance(piece, Pawn) and piece.color == color:
+                        found.append((pawn_row, pawn_col))
+
+        for targets, piece_type in ((KNIGHT_TARGETS[pos], Knight), (KING_TARGETS[pos], King)):
+            for square in targets:
+                piece = board[square[0]][square[1]]
+                if isinstance(piece, piece_type) and piece.color == color and square not in removed:
+                    found.append(square)
+
+        for rays, slider in ((STRAIGHT_RAYS[pos], Rook), (DIAGONAL_RAYS[pos], Bishop)):
+            for ray in rays:
+                for square in ray:
+                    piece = board[square[0]][square[1]]
+                    if piece is not None and square not in removed:
+                        if piece.color == color and isinstance(piece, (slider, Queen)):
+                            found.append(square)
+                        break
+        return found
+
+    def to_fen(self):
+        rows = []
+        for row in self.board:
+            fen_row = ''
+            empty = 0
+            for piece in row:
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    fen_row += str(empty)
+                    empty = 0
+                symbol = FEN_SYMBOLS[piece.name]
+                fen_row += symbol.upper() if piece.color == 'white' else symbol
+            if empty:
+                fen_row += str(empty)
+            rows.append(fen_row)
+
+        castling = ''.join(letter for right, letter in FEN_CASTLING if self.castling & right) or '-'
+        en_passant = '-'
+        if self.en_passant_target is not None:
+            row, col = self.en_passant_target
+            en_passant = f"{chr(col + ord('a'))}{8 - row}"
+        return f"{'/'.join(rows)} {self.turn[0]} {castling} {en_passant} {self.halfmove_clock} {self.fullmove_number}"
+
+    def load_fen(self, fen):
+        # Replaces the position and clears the game history. All six FEN
+        # fields are read; the clocks may be left out.
+        fields = fen.split()
+        if not 4 <= len(fields) <= 6:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        placement, turn, castling, en_passant = fields[:4]
+        rows = placement.split('/')
+        if len(rows) != 8 or turn not in ('w', 'b'):
+            raise ValueError(f"Invalid FEN: {fen!r}")
+
+        pieces = []
+        for row, fen_row in enumerate(rows):
+            col = 0
+            for symbol in fen_row:
+                if symbol in '12345678':
+                    col += int(symbol)
+                    continue
+                if symbol.lower() not in FEN_PIECES or col > 7:
+                    raise ValueError(f"Invalid FEN: {fen!r}")
+                pieces.append(((row, col), FEN_PIECES[symbol.lower()]('white' if symbol.isupper() else 'black')))
+                col += 1
+            if col != 8:
+                raise ValueError(f"Invalid FEN: {fen!r}")
+
+        rights = 0
+        if castling != '-':
+            for letter in castling:
+                if letter not in FEN_RIGHTS or rights & FEN_RIGHTS[letter]:
+                    raise ValueError(f"Invalid FEN: {fen!r}")
+                rights |= FEN_RIGHTS[letter]
+
+        target = None
+        if en_passant != '-':
+            # The square the pawn skipped: rank 3 after a white double
+            # step, so with black to move, and rank 6 after a black one
+            rank = '3' if turn == 'b' else '6'
+            if len(en_passant) != 2 or en_passant[0] not in 'abcdefgh' or en_passant[1] != rank:
+                raise ValueError(f"Invalid FEN: {fen!r}")
+            target = (8 - int(en_passant[1]), ord(en_passant[0]) - ord('a'))
+
+        try:
+            halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+            fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError(f"Invalid FEN: {fen!r}") from None
+        if halfmove_clock < 0 or fullmove_number < 1:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+
+        self.set_position(pieces, 'white' if turn == 'w' else 'black', rights, target, halfmove_clock, fullmove_number)
+
+    def set_position(self, pieces, turn, castling, en_passant_target, halfmove_clock, fullmove_number):
+        # Replaces the position with the (pos, piece) pairs in `pieces` and
+        # the given state, and clears the game history. Used by load_fen
+        # and the binary codec.
+        for row in range(8):
+            for col in range(8):
+                self.set_piece((row, col), None)
+        for pos, piece in pieces:
+            self.set_piece(pos, piece)
+
+        # Rights granted without the king and rook in place are dropped
+        self.hash ^= CASTLING_KEYS[self.castling]
+        self.castling = self.castling_rights(castling)
+        self.hash ^= CASTLING_KEYS[self.castling]
+
+        if turn != self.turn:
+            self.switch_turn()
+        self.set_en_passant_target(en_passant_target)
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+
+        self.move_history = []
+        self.captured = []
+        self.redo_stack = []
+        self.position_counts = {self.hash: 1}
+
+    def create_move(self, start_pos, end_pos, promotion=None):
+        # Builds the Move record for a move of the piece on start_pos; a
+        # pawn reaching the last rank becomes a queen unless `promotion`
+        # names another piece
         piece = self.board[start_pos[0]][start_pos[1]]
-        target_piece = self.board[end_pos[0]][end_pos[1]]
+        captured = self.board[end_pos[0]][end_pos[1]]
+        move = Move(piece, start_pos, end_pos, captured, end_pos)
 
-        # Move the piece
-        self.board[end_pos[0]][end_pos[1]] = piece
-        self.board[start_pos[0]][start_pos[1]] = None
-        piece.has_moved = True
+        if isinstance(piece, Pawn):
+            if end_pos == self.en_passant_target and start_pos[1] != end_pos[1]:
+                move.captured_pos = (start_pos[0], end_pos[1])
+                move.captured = self.board[start_pos[0]][end_pos[1]]
+            elif piece.promote(end_pos):
+                move.promotion = promotion or Queen(piece.color)
+        elif isinstance(piece, King) and abs(start_pos[1] - end_pos[1]) == 2:
+            move.rook_start = (start_pos[0], 0 if end_pos[1] < start_pos[1] else 7)
+            move.rook_end = (start_pos[0], 3 if end_pos[1] < start_pos[1] else 5)
+        return move
 
+    def make_move(self, start_pos, end_pos, promotion=None):
+        move = self.create_move(start_pos, end_pos, promotion)
         self.redo_stack.clear()
+        self.apply_move(move)
+        return move
 
-        piece_moved_before = piece.has_moved
+    def apply_move(self, move):
+        piece = move.piece
+        start_row, start_col = move.start
+        end_row, end_col = move.end
 
-        return piece, start_pos, end_pos, target_piece, piece_moved_before
+        # Save what this move overwrites
+        move.castling = self.castling
+        move.en_passant_target = self.en_passant_target
+        move.en_passant_key = self.en_passant_key
+        move.halfmove_clock = self.halfmove_clock
+        move.hash = self.hash
 
-    def undo_move(self):
+        if move.captured is not None and move.captured_pos != move.end:
+            self.set_piece(move.captured_pos, None)
+        self.set_piece(move.start, None)
+        self.set_piece(move.end, move.promotion or piece)
+        if move.rook_start is not None:
+            rook = self.board[move.rook_start[0]][move.rook_start[1]]
+            self.set_piece(move.rook_start, None)
+            self.set_piece(move.rook_end, rook)
+
+        rights = self.castling & CASTLING_MASKS[start_row][start_col] & CASTLING_MASKS[end_row][end_col]
+        if rights != self.castling:
+            self.hash ^= CASTLING_KEYS[self.castling] ^ CASTLING_KEYS[rights]
+            self.castling = rights
+
+        if isinstance(piece, Pawn) or move.captured is not None:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if self.turn == 'black':
+            self.fullmove_number += 1
+        self.switch_turn()
+        if isinstance(piece, Pawn) and abs(start_row - end_row) == 2:
+            self.set_en_passant_target(((start_row + end_row) // 2, end_col))
+        else:
+            self.set_en_passant_target(None)
+
+        self.move_history.append(move)
+        if move.captured is not None:
+            self.captured.append(move.captured)
+        self.position_counts[self.hash] = self.position_counts.get(self.hash, 0) + 1
+
+    def unmake_move(self):
+        # Takes back the last move and returns it, restoring the saved state
+        # instead of recomputing it
         if not self.move_history:
-            return
-        last_move = self.move_history.pop()
-
-        if len(last_move) == 8 and last_move[4] == "castle":
-            # undo castling
-            piece, start_pos, end_pos, _, _, rook, rook_start_pos, rook_end_pos = last_move
-            self.board[start_pos[0]][start_pos[1]] = piece
-            self.board[end_pos[0]][end_pos[1]] = None
-            self.board[rook_start_pos[0]][rook_start_pos[1]] = rook
-            self.board[rook_end_pos[0]][rook_end_pos[1]] = None
-
-            piece.has_moved = False
-            rook.has_moved = False
-
-            self.redo_stack.append((
-                piece,  #King
-                (start_pos),
-                (end_pos),
-                None,
-                "castle",
-                Rook(piece.color),
-                rook_start_pos,
-                rook_end_pos
-            ))
-        elif len(last_move) == 7 and last_move[5] == "en_passant":
-
-            piece, start_pos, end_pos, target_piece, piece_moved_before, _, en_passant_captured_pos = last_move
-            self.board[start_pos[0]][start_pos[1]] = piece
-            self.board[end_pos[0]][end_pos[1]] = None
-            piece.has_moved = piece_moved_before
-            
-            captured_pawn_row, captured_pawn_col = en_passant_captured_pos
-            color = None
-            if piece.color == 'white':
-                color = 'black'
-            else:
-                color = 'white'
-            self.board[captured_pawn_row][captured_pawn_col] = Pawn(color)
-
-            self.redo_stack.append((piece, start_pos, end_pos, target_piece, piece_moved_before, "en_passant", en_passant_captured_pos))
-        elif len(last_move) == 5:
-            # undo move
-            piece, start_pos, end_pos, target_piece, piece_moved_before = last_move
-            self.board[start_pos[0]][start_pos[1]] = piece
-            self.board[end_pos[0]][end_pos[1]] = target_piece
-            if isinstance(piece, King):
-                piece.has_moved = False
-            else:
-                piece.has_moved = piece_moved_before
-            self.redo_stack.append((piece, start_pos, end_pos, target_piece, piece_moved_before))      
+            return None
+        self.position_counts[self.hash] -= 1
+        move = self.move_history.pop()
+        if move.captured is not None:
+            self.captured.pop()
+        piece = move.piece
+
+        if move.rook_start is not None:
+            rook = self.board[move.rook_end[0]][move.rook_end[1]]
+            self.set_piece(move.rook_end, None)
+            self.set_piece(move.rook_start, rook)
+        self.set_piece(move.end, None)
+        self.set_piece(move.start, piece)
+        if move.captured is not None:
+            self.set_piece(move.captured_pos, move.captured)
 
+        self.turn = piece.color
+        if self.turn == 'black':
+            self.fullmove_number -= 1
+        self.castling = move.castling
+        self.en_passant_target = move.en_passant_target
+        self.en_passant_key = move.en_passant_key
+        self.halfmove_clock = move.halfmove_clock
+        self.hash = move.hash
+        return move
+
+    def undo_move(self):
+        move = self.unmake_move()
+        if move is not None:
+            self.redo_stack.append(move)
 
     def redo_move(self):
         if self.redo_stack:
-       
-            move = self.redo_stack.pop()
-
-            if len(move) == 8 and move[4] == "castle":
-                piece, start_pos, end_pos, target_piece, _, rook, rook_start_pos, rook_end_pos = move
-                
-                # Move the king
-                self.board[start_pos[0]][start_pos[1]] = None
-                self.board[end_pos[0]][end_pos[1]] = piece
-                piece.has_moved = True
-
-                # Move the rook
-                self.board[rook_start_pos[0]][rook_start_pos[1]] = None
-                self.board[rook_end_pos[0]][rook_end_pos[1]] = rook
-                rook.has_moved = True
-
-                self.move_history.append((
-                    piece,
-                    (start_pos),
-                    (end_pos),
-                    None,
-                    "castle",
-                    Rook(piece.color),
-                    rook_start_pos,
-                    rook_end_pos
-                ))
-
-            elif len(move) == 7 and move[5] == "en_passant":
-                # Handle en passant
-                piece, start_pos, end_pos, target_piece, piece_moved_before,  _, en_passant_captured_pos = move
-                
-                # Move the pawn that performed en passant
-                self.board[start_pos[0]][start_pos[1]] = None
-                self.board[end_pos[0]][end_pos[1]] = piece
-                piece.has_moved = piece_moved_before
-
-                # Restore the captured pawn
-                captured_row, captured_col = en_passant_captured_pos
-                self.board[captured_row][captured_col] = target_piece
-
-                self.move_history.append(move)
-
-            else:
-                piece, start_pos, end_pos, target_piece, piece_moved_before = move
-                self.board[start_pos[0]][start_pos[1]] = None
-                if isinstance(piece, Pawn) and piece.color == 'white' and end_pos[0] == 0 or isinstance(piece, Pawn) and piece.color == 'black' and end_pos[0] == 7:
-                    self.board[end_pos[0]][end_pos[1]] = piece.promotion
-                else:
-                    self.board[end_pos[0]][end_pos[1]] = piece
-                piece.has_moved = piece_moved_before
-
-                self.move_history.append((piece, start_pos, end_pos, target_piece, True))
-        
-        
-        
+            self.apply_move(self.redo_stack.pop())
@@ -0,0 +1,46 @@
+import pygame
+
+WHITE = (255, 255, 255)
+GRAY = (128, 128, 128)
+
+class BoardView:
+    # Draws a Board with pygame. Kept apart from Board so that the rules
+    # engine can be imported without pygame.
+
+    def __init__(self, board):
+        self.board = board
+
+    def draw_board(self, window, square_size, flipped=False):
+        colors = [WHITE, GRAY]
+        for row in range(8):
+            for col in range(8):
+                color = colors[(row + col) % 2]
+                if flipped:
+                    pygame.draw.rect(window, color, ((7 - col) * square_size, (7 - row) * square_size, square_size, square_size))
+                else:
+                    pygame.draw.rect(window, color, (col * square_size, row * square_size, square_size, square_size))
+
+    def draw_pieces(self, window, IMAGES, square_size, flipped=False):
+        for row in range(8):
+            for col in range(8):
+                piece = self.board.board[row][col]
+                if piece:
+                    piece_name = f"{piece.color}_{piece.__class__.__name__.lower()}"
+                    if flipped:
+                        window.blit(IMAGES[piece_name], ((7 - col) * square_size, (7 - row) * square_size))
+                    else:
+                        window.blit(IMAGES[piece_name], (col * square_size, row * square_size))
+    
+    def promotion_pieces(self, window, IMAGES, square_size, color, option, col, row, flipped=False):
+        # IMAGES are already square_size
+        image = IMAGES[f"{color}_{option['name']}"]
+        if (color == 'black' and not flipped) or (color == 'white' and flipped):
+            pygame.draw.rect(window, (203, 203, 203),
+                             (col * square_size, (7 - row) * square_size, square_size, square_size))
+            window.blit(image, (col * square_size, (7 - row) * square_size))
+            option['properties'] = (7 - row, col)
+        else:
+            pygame.draw.rect(window, (203, 203, 203),
+                             (col * square_size, row * square_size, square_size, square_size))
+            window.blit(image, (col * square_size, row * square_size))
+            option['properties'] = (row, col)
@@ -1,14 +1,60 @@
+import re
+
 from Piece import *
-from Board import *
+from Board import Board, FEN_SYMBOLS, FEN_PIECES, PROMOTION_PIECES
+from Bitboard import BitboardBoard
+from config import BOARD_BACKEND
+
+BOARD_BACKENDS = {
+    'mailbox': Board,
+    'bitboard': BitboardBoard,
+}
+
+# Piece letter, start file, start rank, target square and promotion piece
+# of a SAN move other than castling
+SAN_PATTERN = re.compile(r'([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?')
+
+class GameStatus:
+    # How the game stands in one position, worked out once after each move,
+    # undo or redo so that a UI can read it every frame for free
+    def __init__(self, game):
+        color = game.current_turn
+        self.turn = color
+        self.king_pos = game.find_king(color)
+        self.in_check = game.is_in_check(color)
+        has_moves = game.has_legal_moves(color)
+        self.checkmate = self.in_check and not has_moves
+        self.stalemate = not self.in_check and not has_moves
+        self.threefold_repetition = game.is_threefold_repetition()
+        self.fifty_move_rule = game.is_fifty_move_rule()
+
+    @property
+    def is_draw(self):
+        return self.stalemate or self.threefold_repetition or self.fifty_move_rule
+
+    @property
+    def is_over(self):
+        return self.checkmate or self.is_draw
 
 class ChessGame:
-    def __init__(self):
-        self.board = Board()
-        self.current_turn = 'white'
-        self.en_passant_target = None
+    def __init__(self, backend=BOARD_BACKEND, fen=None):
+        self.board = BOARD_BACKENDS[backend]()
+        if fen is not None:
+            self.board.load_fen(fen)
+
+    @property
+    def current_turn(self):
+        return self.board.turn
+
+    @property
+    def en_passant_target(self):
+        return self.board.en_passant_target
 
     def switch_turn(self):
-        self.current_turn = 'black' if self.current_turn == 'white' else 'white'
+        self.board.switch_turn()
+
+    def make_move(self, start_pos, end_pos, promotion=None):
+        return self.board.make_move(start_pos, end_pos, promotion)
 
     def is_in_bounds(self, pos):
         return 0 <= pos[0] < 8 and 0 <= pos[1] < 8
@@ -26,110 +72,162 @@ class ChessGame:
         col_notation = chr(col + ord('a'))
         return f"{col_notation}{row_notation}"
 
-    def is_threefold_repetition(self, move_history):
-        positions = {}
-        for move in move_history:
-            if len(move) == 8 and move[4] == "castle":
-                _, start_pos, end_pos, _, _, _, rook_start_pos, rook_end_pos = move
-                board_state = (start_pos, end_pos, rook_start_pos, rook_end_pos)
-            elif len(move) == 6 and move[5] == "en_passant":
-                _, start_pos, end_pos, _, en_passant_captured_pos, _ = move
-                board_state = (start_pos, end_pos, en_passant_captured_pos)
-            elif len(move) == 5:
-                _, start_pos, end_pos, _, _ = move
-                board_state = (start_pos, end_pos) 
-            if board_state in positions:
-                positions[board_state] += 1
-                if positions[board_state] == 3:
-                    return True
+    def move_to_uci(self, start_pos, end_pos, promotion=None):
+        text = self.to_algebraic_notation(*start_pos) + self.to_algebraic_notation(*end_pos)
+        if promotion is not None:
+            text += FEN_SYMBOLS[promotion.name]
+        return text
+
+    def move_to_san(self, start_pos, end_pos, promotion=None):
+        # Standard algebraic notation of a legal move in the current
+        # position, e.g. 'Nbd7', 'exd6', 'e8=Q+', 'O-O', 'Qh4#'
+        board = self.board
+        piece = board.board[start_pos[0]][start_pos[1]]
+        target = self.to_algebraic_notation(*end_pos)
+        if isinstance(piece, King) and abs(start_pos[1] - end_pos[1]) == 2:
+            text = 'O-O' if end_pos[1] > start_pos[1] else 'O-O-O'
+        elif isinstance(piece, Pawn):
+            text = target
+            if start_pos[1] != end_pos[1]:
+                text = f"{self.to_algebraic_notation(*start_pos)[0]}x{target}"
+            if piece.promote(end_pos):
+                text += '=' + FEN_SYMBOLS[promotion.name if promotion is not None else 'queen'].upper()
+        else:
+            # Name the start file, rank or square if another piece of the
+            # same kind can also move there
+            rivals = [start for start, end in self.generate_legal_moves(piece.color)
+                      if end == end_pos and start != start_pos and board.board[start[0]][start[1]].name == piece.name]
+            square = self.to_algebraic_notation(*start_pos)
+            if not rivals:
+                origin = ''
+            elif all(start[1] != start_pos[1] for start in rivals):
+                origin = square[0]
+            elif all(start[0] != start_pos[0] for start in rivals):
+                origin = square[1]
             else:
-                positions[board_state] = 1
-        return False
+                origin = square
+            capture = 'x' if board.board[end_pos[0]][end_pos[1]] is not None else ''
+            text = f"{FEN_SYMBOLS[piece.name].upper()}{origin}{capture}{target}"
 
-    def is_fifty_move_rule(self, move_history):
-        count = 0
-        for move in reversed(move_history):
-            if len(move) == 8 and move[4] == "castle":
-                piece, _, _, _, _, _, _, _ = move
-            elif len(move) == 6 and move[5] == "en_passant":
-                piece, _, _, _, _, _ = move
-            elif len(move) == 5:
-                piece, _, _, target_piece, _ = move
-                if isinstance(piece, Pawn) or target_piece is not None:
-                    break
-            count += 1
-            if count >= 50:
-                return True
-        return False
+        board.apply_move(board.create_move(start_pos, end_pos, promotion))
+        color = board.turn
+        if self.is_in_check(color):
+            text += '+' if self.has_legal_moves(color) else '#'
+        board.unmake_move()
+        return text
+
+    def parse_san(self, san):
+        # The (start, end, promotion) of the legal move written `san` in
+        # the current position. Check marks and annotations are ignored;
+        # a move that is illegal, ambiguous or malformed raises ValueError.
+        text = san.rstrip('+#!?')
+        color = self.current_turn
+        board = self.board.board
+
+        if text in ('O-O', 'O-O-O', '0-0', '0-0-0'):
+            start = self.board.find_king(color)
+            if start is not None:
+                end = (start[0], start[1] + (2 if len(text) == 3 else -2))
+                if end in self.board.castling_moves(color) and end in self.get_legal_moves(start):
+                    return start, end, None
+            raise ValueError(f"Illegal move: {san!r}")
+
+        match = SAN_PATTERN.fullmatch(text)
+        if match is None:
+            raise ValueError(f"Invalid move: {san!r}")
+        letter, start_file, start_rank, target, promotion = match.groups()
+        name = FEN_PIECES[letter.lower()].name if letter else 'pawn'
+        end = self.parse_position(target)
+        if name == 'pawn' and start_file is None:
+            # A pawn that does not capture stays on its file
+            start_file = target[0]
+
+        starts = []
+        for start in SQUARES:
+            piece = board[start[0]][start[1]]
+            if piece is None or piece.color != color or piece.name != name:
+                continue
+            if start_file is not None and start[1] != ord(start_file) - ord('a'):
+                continue
+            if start_rank is not None and start[0] != 8 - int(start_rank):
+                continue
+            if any(move_end == end for _, move_end in self.generate_legal_moves(color, start)):
+                starts.append(start)
+        if len(starts) != 1:
+            raise ValueError(f"{'Ambiguous' if starts else 'Illegal'} move: {san!r}")
+
+        if name == 'pawn' and end[0] in (0, 7):
+            if promotion is None:
+                raise ValueError(f"Missing promotion piece: {san!r}")
+            return starts[0], end, FEN_PIECES[promotion.lower()](color)
+        if promotion is not None:
+            raise ValueError(f"Invalid move: {san!r}")
+        return starts[0], end, None
+
+    def history_san(self, first=0):
+        # SAN of the moves played from ply `first` on. The moves are taken
+        # back and replayed, so each is written in its own position.
+        board = self.board
+        moves = board.move_history[first:]
+        for _ in moves:
+            board.unmake_move()
+        notation = []
+        for move in moves:
+            notation.append(self.move_to_san(move.start, move.end, move.promotion))
+            board.apply_move(move)
+        return notation
+
+    def status(self):
+        return GameStatus(self)
+
+    def is_threefold_repetition(self):
+        # The board counts every position by its Zobrist hash as moves are
+        # made, undone and redone
+        return self.board.position_counts.get(self.board.hash, 0) >= 3
+
+    def is_fifty_move_rule(self):
+        return self.board.halfmove_clock >= 100
+
+    def is_seventy_five_move_rule(self):
+        return self.board.halfmove_clock >= 150
+
+    def to_fen(self):
+        return self.board.to_fen()
+
+    def load_fen(self, fen):
+        self.board.load_fen(fen)
     
     def find_king(self, color):
-        for row in range(8):
-            for col in range(8):
-                piece = self.board.board[row][col]
-                if isinstance(piece, King) and piece.color == color:
-                    return (row, col)
-        return None
+        return self.board.find_king(color)
     
     def is_in_check(self, color):
-        king_pos = self.find_king(color)
+        king_pos = self.board.find_king(color)
         if not king_pos:
             return False
-        
-        #print(f"King's position {color}: {king_pos}")
-
-        for row in range(8):
-            for col in range(8):
-                piece = self.board.board[row][col]
-                if piece and piece.color != color:
-                    if piece.is_valid_move((row, col), king_pos, self.board.board):
-                        #print(f"The piece at {(row, col)} can attack the king at {king_pos}")
-                        return True
-        return False
+        return self.board.is_attacked_by(king_pos, 'black' if color == 'white' else 'white')
     
     def get_valid_moves(self,piece, start_pos, board, en_passant_target=None, flipped=False):
-        valid_moves = []
-        for row in range(8):
-            for col in range(8):
-                end_pos = (row, col)
-                if flipped:
-                    end_pos = (7 - row, 7 - col)
-
-                if isinstance(piece, Pawn):
-                    if piece.is_valid_move(start_pos, end_pos, board, en_passant_target):
-                        valid_moves.append(end_pos)
-                else:
-                    if piece.is_valid_move(start_pos, end_pos, board):
-                        valid_moves.append(end_pos)
-        return valid_moves
+        return list(piece.generate_moves(start_pos, board, en_passant_target))
     
+    def generate_legal_moves(self, color, start_pos=None):
+        # Yields (start, end) for every legal move of `color`, or only for the
+        # piece on `start_pos`; each board backend has its own generator
+        return self.board.generate_legal_moves(color, start_pos)
+
+    def get_legal_moves(self, start_pos):
+        piece = self.board.board[start_pos[0]][start_pos[1]]
+        if piece is None:
+            return []
+        return [end for _, end in self.generate_legal_moves(piece.color, start_pos)]
+
+    def legal_moves(self):
+        # All legal moves of the side to move as (start, end, promotion),
+        # with one entry per promotion piece
+        return self.board.legal_moves(self.current_turn)
+
     def has_legal_moves(self, color):
-        original_turn = self.current_turn
-        self.current_turn = color  # Change the turn to the color being checked
-
-        for row in range(8):
-            for col in range(8):
-                piece = self.board.board[row][col]
-                if piece and piece.color == color:
-                    for r in range(8):
-                        for c in range(8):
-                            if self.is_valid_move((row, col), (r, c), simulate=True):
-                                
-                                original_piece = self.board.board[r][c]
-
-                                self.board.move_piece((row, col), (r, c))
-                                # Check if the king is still in check
-                                in_check = self.is_in_check(color)
-
-                                # Undo the move
-                                self.board.move_piece((r, c), (row, col))
-                                self.board.board[r][c] = original_piece
-                                piece.has_moved = False
-                                
-                                # If there is any legal move, return True
-                                if not in_check:
-                                    self.current_turn = original_turn
-                                    return True
-        self.current_turn = original_turn
+        for _ in self.generate_legal_moves(color):
+            return True
         return False
     
     def is_checkmate(self, color):
@@ -147,13 +245,7 @@ class ChessGame:
         return False
     
     def is_square_attacked(self, position, color):
-        for row in range(8):
-            for col in range(8):
-                piece = self.board.board[row][col]
-                if piece and piece.color != color:
-                    if self.is_valid_move((row, col), position, simulate=True):
-                        return True
-        return False
+        return self.board.is_attacked_by(position, 'black' if color == 'white' else 'white')
     
     def is_valid_move(self, start_pos, end_pos, en_passant_target=None, simulate=False):
         piece = self.board.board[start_pos[0]][start_pos[1]]
@@ -164,21 +256,12 @@ class ChessGame:
 
         if isinstance(piece, King) and abs(start_pos[1] - end_pos[1]) == 2:
 
-            if piece.has_moved:
-                return False
-
-            rook_col = 0 if end_pos[1] < start_pos[1] else 7
-            rook = self.board.board[start_pos[0]][rook_col]
-            
-            if not isinstance(rook, Rook) or rook.has_moved:
+            # The castling right must be held and the squares up to the
+            # rook empty
+            if end_pos not in self.board.castling_moves(piece.color):
                 return False
-
-            # Check for empty squares between the king and the rook
             step = 1 if end_pos[1] > start_pos[1] else -1
-            for col in range(start_pos[1] + step, end_pos[1], step):
-                if self.board.board[start_pos[0]][col] is not None:
-                    return False
-            
+
             # Check if the king is in check in any square between the king and the rook
             if self.is_in_check(self.current_turn):
                 return False
@@ -194,9 +277,4 @@ class ChessGame:
         else:
             is_valid = piece.is_valid_move(start_pos, end_pos, self.board.board)
 
-        if is_valid:
-            if simulate:
-                piece.has_moved = False
-            return True
-
-        return False
+        return is_valid
@@ -0,0 +1,101 @@
+import struct
+
+from Piece import Pawn, Knight, Bishop, Rook, Queen, King
+
+# A position in 32 bytes: the occupied squares as a 64-bit set, one
+# nibble per occupied square in square order (at most 32 pieces), the
+# flags, the halfmove clock and the fullmove number. Records are fixed
+# width, so a file of them can be indexed and decoded in place.
+RECORD = struct.Struct('<Q16sHHH2x')
+RECORD_SIZE = RECORD.size
+
+# Flags: bit 0 black to move, bits 1-4 castling rights, bits 5-8 en
+# passant file + 1 (0 if there is no en passant square)
+BLACK_TO_MOVE = 1
+CASTLING_SHIFT = 1
+EN_PASSANT_SHIFT = 5
+
+# Nibble of each piece: its type, plus 8 for black
+PIECE_TYPES = (Pawn, Knight, Bishop, Rook, Queen, King)
+PIECE_CODES = {
+    (color, piece_type.name): index + (8 if color == 'black' else 0)
+    for index, piece_type in enumerate(PIECE_TYPES)
+    for color in ('white', 'black')
+}
+CODE_PIECES = [None] * 16
+for (_color, _name), _code in PIECE_CODES.items():
+    CODE_PIECES[_code] = PIECE_TYPES[_code & 7](_color)
+
+
+def encode_position(board):
+    # The record of the current position of `board` as bytes. The game
+    # history, like in a FEN, is not part of it.
+    buffer = bytearray(RECORD_SIZE)
+    encode_position_into(buffer, 0, board)
+    return bytes(buffer)
+
+def encode_position_into(buffer, offset, board):
+    # Writes the record into a writable buffer (a bytearray, mmap, ...)
+    # at `offset`, so many positions can be stored without a bytes
+    # object each
+    occupancy = 0
+    nibbles = bytearray(16)
+    count = 0
+    for row in range(8):
+        for col, piece in enumerate(board.board[row]):
+            if piece is None:
+                continue
+            if count == 32:
+                raise ValueError("A position with more than 32 pieces cannot be encoded")
+            nibbles[count >> 1] |= PIECE_CODES[piece.color, piece.name] << (4 * (count & 1))
+            occupancy |= 1 << (row * 8 + col)
+            count += 1
+
+    flags = board.castling << CASTLING_SHIFT
+    if board.turn == 'black':
+        flags |= BLACK_TO_MOVE
+    if board.en_passant_target is not None:
+        flags |= (board.en_passant_target[1] + 1) << EN_PASSANT_SHIFT
+    if not (0 <= board.halfmove_clock <= 0xFFFF and 0 < board.fullmove_number <= 0xFFFF):
+        raise ValueError("Move counters out of range for the binary encoding")
+    RECORD.pack_into(buffer, offset, occupancy, bytes(nibbles), flags, board.halfmove_clock, board.fullmove_number)
+
+def decode_position(buffer, offset=0):
+    # Reads the record at `offset` of any bytes-like object (bytes,
+    # memoryview, mmap) without copying the buffer. Returns the arguments
+    # of Board.set_position.
+    return _fields(*RECORD.unpack_from(buffer, offset))
+
+def iter_positions(buffer):
+    # Decodes a buffer of back-to-back records one at a time
+    for record in RECORD.iter_unpack(memoryview(buffer)):
+        yield _fields(*record)
+
+def load_position(board, buffer, offset=0):
+    # Sets `board` to the position of the record at `offset`
+    board.set_position(*decode_position(buffer, offset))
+
+def _fields(occupancy, nibbles, flags, halfmove_clock, fullmove_number):
+    if bin(occupancy).count('1') > 32:
+        raise ValueError("Invalid occupancy in position record")
+    pieces = []
+    index = 0
+    while occupancy:
+        low = occupancy & -occupancy
+        sq = low.bit_length() - 1
+        piece = CODE_PIECES[(nibbles[index >> 1] >> (4 * (index & 1))) & 15]
+        if piece is None:
+            raise ValueError("Invalid piece code in position record")
+        pieces.append(((sq >> 3, sq & 7), piece))
+        occupancy ^= low
+        index += 1
+
+    turn = 'black' if flags & BLACK_TO_MOVE else 'white'
+    castling = (flags >> CASTLING_SHIFT) & 15
+    en_passant_file = (flags >> EN_PASSANT_SHIFT) & 15
+    en_passant_target = None
+    if en_passant_file:
+        if en_passant_file > 8:
+            raise ValueError("Invalid en passant file in position record")
+        en_passant_target = (2 if turn == 'white' else 5, en_passant_file - 1)
+    return pieces, turn, castling, en_passant_target, halfmove_clock, fullmove_number
@@ -0,0 +1,419 @@
+import argparse
+import time
+
+from ChessGame import ChessGame, BOARD_BACKENDS
+from Bitboard import BitboardBoard
+from Transposition import TranspositionTable, EXACT, LOWER, UPPER, encode_move, decode_move
+from MoveOrdering import MoveOrderer, mvv_lva
+from Exchange import static_exchange
+from Piece import PIECE_VALUES
+from config import BOARD_BACKEND, INITIAL_TIME
+
+INFINITY = 1000000
+MATE = 100000
+# Scores beyond this are mates, counted in plies from the root
+MATE_BOUND = MATE - 1000
+
+# Piece-square bonuses from white's point of view, row 0 being the 8th rank
+PIECE_SQUARE_TABLES = {
+    'pawn': [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    'knight': [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ],
+    'bishop': [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ],
+    'rook': [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ],
+    'queen': [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ],
+    'king': [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ],
+}
+
+# Moves a game is expected to last beyond the current one when budgeting time
+MOVES_TO_GO = 30
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchResult:
+    def __init__(self, move, score, depth, nodes, elapsed):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+
+    @property
+    def nps(self):
+        return int(self.nodes / max(self.elapsed, 1e-9))
+
+
+def score_to_table(score, ply):
+    # Mate scores are stored relative to the node, not the root
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+def score_from_table(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+def move_first(moves, move_code):
+    # Moves the move matching a transposition table move code to the front
+    start, end, promotion = decode_move(move_code)
+    for i, move in enumerate(moves):
+        if move[0] == start and move[1] == end and (move[2].name if move[2] is not None else None) == promotion:
+            moves[0], moves[i] = move, moves[0]
+            return
+
+
+def think_time(remaining, initial_time=INITIAL_TIME):
+    # Seconds to spend on one move: an even share of the remaining clock,
+    # capped at twice an even share of the initial clock so that a full
+    # clock early in the game is not spent on the opening
+    return max(0.05, min(remaining / MOVES_TO_GO, 2 * initial_time / MOVES_TO_GO))
+
+
+class Engine:
+    # Negamax alpha-beta search over a ChessGame with iterative deepening.
+    # Moves are played with Board.apply_move/unmake_move, which leave the
+    # game's redo stack alone.
+
+    def __init__(self, game, tt=None, ordering=True):
+        self.game = game
+        self.tt = tt if tt is not None else TranspositionTable()
+        # Without an orderer only the transposition table move goes first
+        self.orderer = MoveOrderer() if ordering else None
+        self.deadline = None
+        # A threading.Event that ends the search early when set
+        self.stop_event = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.nodes = 0
+        # Quiescence counters: nodes, captures looked at, captures skipped
+        # because they lose material, and stand-pat cutoffs
+        self.qnodes = 0
+        self.captures = 0
+        self.see_pruned = 0
+        self.stand_pat_cutoffs = 0
+
+    def evaluate(self):
+        # Material and piece-square score from the side to move's view
+        board = self.game.board
+        if isinstance(board, BitboardBoard):
+            score = self.evaluate_bitboards(board)
+            return score if board.turn == 'white' else -score
+        score = 0
+        for row, pieces in enumerate(board.board):
+            for col, piece in enumerate(pieces):
+                if piece is None:
+                    continue
+                if piece.color == 'white':
+                    score += PIECE_VALUES[piece.name] + PIECE_SQUARE_TABLES[piece.name][row * 8 + col]
+                else:
+                    score -= PIECE_VALUES[piece.name] + PIECE_SQUARE_TABLES[piece.name][(7 - row) * 8 + col]
+        return score if board.turn == 'white' else -score
+
+    def evaluate_bitboards(self, board):
+        # The same score from white's view, summed over the piece sets; a
+        # black piece on square sq reads the table at its mirror, sq ^ 56
+        score = 0
+        white = board.bitboards['white']
+        black = board.bitboards['black']
+        for name, table in PIECE_SQUARE_TABLES.items():
+            value = PIECE_VALUES[name]
+            pieces = white[name]
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                score += value + table[low.bit_length() - 1]
+            pieces = black[name]
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                score -= value + table[(low.bit_length() - 1) ^ 56]
+        return score
+
+    def check_time(self):
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchTimeout()
+
+    def negamax(self, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self.check_time()
+
+        board = self.game.board
+        if ply and (board.halfmove_clock >= 100 or board.position_counts.get(board.hash, 0) > 1):
+            return 0
+        if depth == 0:
+            return self.quiescence(alpha, beta, ply)
+
+        key = board.hash
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_move, tt_depth, tt_score, bound = entry
+            if tt_depth >= depth:
+                tt_score = score_from_table(tt_score, ply)
+                if (bound == EXACT or (bound == LOWER and tt_score >= beta)
+                        or (bound == UPPER and tt_score <= alpha)):
+                    return tt_score
+
+        moves = self.game.legal_moves()
+        if not moves:
+            return -MATE + ply if self.game.is_in_check(board.turn) else 0
+        if self.orderer is not None:
+            moves = self.orderer.order(moves, board.board, ply, entry[0] if entry is not None else 0)
+        elif entry is not None and entry[0]:
+            move_first(moves, entry[0])
+
+        alpha_original = alpha
+        best = -INFINITY
+        best_move = None
+        for move in moves:
+            board.apply_move(board.create_move(*move))
+            score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            board.unmake_move()
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if self.orderer is not None:
+                            self.orderer.record_cutoff(move, board.board, depth, ply)
+                        break
+
+        if best >= beta:
+            bound = LOWER
+        elif best > alpha_original:
+            bound = EXACT
+        else:
+            bound = UPPER
+        self.tt.store(key, encode_move(best_move), depth, score_to_table(best, ply), bound)
+        return best
+
+    def quiescence(self, alpha, beta, ply):
+        # Searches captures and promotions only until the position is
+        # quiet, so the evaluation is not taken in the middle of an exchange
+        self.nodes += 1
+        self.qnodes += 1
+        if self.nodes & 1023 == 0:
+            self.check_time()
+
+        # Standing pat: the side to move is assumed to have at least one
+        # quiet move that keeps the static score
+        stand_pat = self.evaluate()
+        if stand_pat >= beta:
+            self.stand_pat_cutoffs += 1
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        board = self.game.board
+        moves = self.game.legal_moves()
+        if not moves:
+            return -MATE + ply if self.game.is_in_check(board.turn) else 0
+        mailbox = board.board
+        captures = [move for move in moves if move[2] is not None or mvv_lva(move, mailbox)]
+        captures.sort(key=lambda move: mvv_lva(move, mailbox), reverse=True)
+
+        best = stand_pat
+        for move in captures:
+            self.captures += 1
+            # Captures that lose material in the exchange are not searched
+            if move[2] is None and static_exchange(board, move) < 0:
+                self.see_pruned += 1
+                continue
+            board.apply_move(board.create_move(*move))
+            score = -self.quiescence(-beta, -alpha, ply + 1)
+            board.unmake_move()
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+    def search_root(self, depth, moves):
+        board = self.game.board
+        alpha = -INFINITY
+        best_move = None
+        for move in moves:
+            board.apply_move(board.create_move(*move))
+            try:
+                score = -self.negamax(depth - 1, -INFINITY, -alpha, 1)
+            finally:
+                board.unmake_move()
+            if score > alpha:
+                alpha = score
+                best_move = move
+                # The previous best move is searched first, so anything that
+                # beats it is safe to play even if this depth is not finished
+                self.best_move, self.best_score = best_move, alpha
+        self.tt.store(board.hash, encode_move(best_move), depth, alpha, EXACT)
+        return best_move, alpha
+
+    def search(self, max_depth=64, time_limit=None, info=None):
+        # Deepens one ply at a time until max_depth or time_limit seconds,
+        # and returns the best move of the deepest completed iteration (or a
+        # better one found so far in the iteration that ran out of time)
+        start_time = time.perf_counter()
+        self.deadline = start_time + time_limit if time_limit is not None else None
+        self.reset_stats()
+        self.tt.new_search()
+        self.tt.reset_stats()
+        board = self.game.board
+        root_length = len(board.move_history)
+
+        moves = self.game.legal_moves()
+        if not moves:
+            return SearchResult(None, 0, 0, 0, 0.0)
+        if self.orderer is not None:
+            self.orderer.new_search()
+            moves = self.orderer.order(moves, board.board, 0)
+        self.best_move, self.best_score = moves[0], -INFINITY
+        depth_reached = 0
+
+        for depth in range(1, max_depth + 1):
+            try:
+                best_move, score = self.search_root(depth, moves)
+            except SearchTimeout:
+                while len(board.move_history) > root_length:
+                    board.unmake_move()
+                break
+            depth_reached = depth
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+            if info is not None:
+                info(self.report(depth, score, start_time))
+            # Stop early on a forced mate or when another ply is unlikely to finish
+            elapsed = time.perf_counter() - start_time
+            if abs(score) > MATE_BOUND or (time_limit is not None and elapsed > time_limit / 2):
+                break
+
+        return SearchResult(self.best_move, self.best_score, depth_reached, self.nodes, time.perf_counter() - start_time)
+
+    def report(self, depth, score, start_time):
+        elapsed = time.perf_counter() - start_time
+        return (f"depth {depth} score {score} nodes {self.nodes} nps {int(self.nodes / max(elapsed, 1e-9))} "
+                f"time {elapsed:.2f} move {self.game.move_to_uci(*self.best_move)} qnodes {self.qnodes} "
+                f"see pruned {self.see_pruned}/{self.captures} ({self.see_pruned / max(self.captures, 1):.0%}) "
+                f"stand pat {self.stand_pat_cutoffs} tt {self.tt.stats()}")
+
+
+def play(game, white_time=INITIAL_TIME, black_time=INITIAL_TIME, max_moves=200, info=None, tt=None):
+    # Engine-vs-engine game at a fixed time control; returns the result
+    clocks = {'white': white_time, 'black': black_time}
+    engine = Engine(game, tt)
+    for _ in range(max_moves * 2):
+        color = game.current_turn
+        if not game.has_legal_moves(color):
+            return f"{'black' if color == 'white' else 'white'} wins" if game.is_in_check(color) else "draw (stalemate)"
+        if game.is_threefold_repetition():
+            return "draw (threefold repetition)"
+        if game.is_fifty_move_rule():
+            return "draw (fifty-move rule)"
+
+        result = engine.search(time_limit=think_time(clocks[color]))
+        clocks[color] -= result.elapsed
+        if clocks[color] <= 0:
+            return f"{'black' if color == 'white' else 'white'} wins on time"
+        if info is not None:
+            info(f"{game.board.fullmove_number}. {color} {game.move_to_uci(*result.move)} "
+                 f"(depth {result.depth}, {result.nodes} nodes, {result.nps} nps, {clocks[color]:.1f}s left)")
+        game.make_move(*result.move)
+    return "draw (move limit)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search a position, or play the engine against itself")
+    parser.add_argument('--fen')
+    parser.add_argument('--depth', type=int, default=64)
+    parser.add_argument('--time', type=float, help="seconds per move (default: budget from the clock)")
+    parser.add_argument('--selfplay', action='store_true', help=f"play a game with {INITIAL_TIME}s per side")
+    parser.add_argument('--hash', type=int, help="transposition table size in MB")
+    parser.add_argument('--backend', choices=sorted(BOARD_BACKENDS), default=BOARD_BACKEND)
+    parser.add_argument('--workers', type=int, default=1, help="search processes (root splitting when above 1)")
+    args = parser.parse_args()
+
+    game = ChessGame(args.backend, args.fen)
+    tt = TranspositionTable(args.hash) if args.hash is not None else None
+    if args.selfplay:
+        print(play(game, info=print, tt=tt))
+        return
+
+    time_limit = args.time if args.time is not None else think_time(INITIAL_TIME)
+    if args.workers > 1:
+        # Parallel imports this module
+        from Parallel import ParallelSearch
+        with ParallelSearch(game, args.workers, backend=args.backend) as search:
+            result = search.search(args.depth, time_limit, info=print)
+    else:
+        result = Engine(game, tt).search(args.depth, time_limit, info=print)
+    if result.move is not None:
+        print(f"bestmove {game.move_to_uci(*result.move)}")
+
+
+if __name__ == "__main__":
+    main()
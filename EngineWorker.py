@@ -0,0 +1,79 @@
+import queue
+import threading
+
+from Engine import Engine
+from Parallel import pack_position, unpack_position
+from config import BOARD_BACKEND
+
+
+class EngineWorker:
+    # Runs Engine searches on a background thread so a caller such as the
+    # pygame loop never waits for one. Requests and results go through
+    # queues; the search works on its own copy of the position, so the
+    # caller's board is never touched while it is being drawn.
+    #
+    #   worker.start(game, time_limit)   begin thinking about game's position
+    #   worker.poll()                    the SearchResult once done, else None
+    #   worker.stop()                    finish now with the best move so far
+    #   worker.cancel()                  abandon the search, no result
+
+    def __init__(self, tt=None, backend=BOARD_BACKEND):
+        self.engine = Engine(None, tt)
+        self.backend = backend
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        # Id and stop event of the search whose result is wanted
+        self.search_id = 0
+        self.stop_event = None
+        self.thread = threading.Thread(target=self.run, name="engine", daemon=True)
+        self.thread.start()
+
+    @property
+    def busy(self):
+        return self.stop_event is not None
+
+    def start(self, game, time_limit=None, max_depth=64):
+        self.cancel()
+        self.search_id += 1
+        self.stop_event = threading.Event()
+        self.requests.put((self.search_id, self.stop_event, pack_position(game.board), time_limit, max_depth))
+        return self.search_id
+
+    def stop(self):
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    def cancel(self):
+        # The running search is stopped and its result will be dropped
+        self.stop()
+        self.stop_event = None
+        self.search_id += 1
+
+    def poll(self):
+        while True:
+            try:
+                search_id, result = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            if search_id == self.search_id:
+                self.stop_event = None
+                return result
+
+    def close(self):
+        self.cancel()
+        self.requests.put(None)
+        self.thread.join()
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            search_id, stop_event, position, time_limit, max_depth = request
+            if stop_event.is_set():
+                continue
+            engine = self.engine
+            engine.game = unpack_position(position, self.backend)
+            engine.stop_event = stop_event
+            result = engine.search(max_depth, time_limit)
+            self.results.put((search_id, result))
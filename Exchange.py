@@ -0,0 +1,59 @@
+from Piece import Pawn
+
+# Exchange values; the king is worth more than anything it could win
+SEE_VALUES = {'pawn': 100, 'knight': 320, 'bishop': 330, 'rook': 500, 'queen': 900, 'king': 20000}
+
+
+def least_valuable(board, positions):
+    # The cheapest piece among `positions` as (value, position)
+    return min((SEE_VALUES[board[row][col].name], (row, col)) for row, col in positions)
+
+
+def static_exchange(board, move):
+    # Material won (in SEE_VALUES) by the side playing the (start, end,
+    # promotion) capture `move` on `board` (a Board), assuming both sides
+    # keep recapturing on the target square with their least valuable
+    # piece and may stop whenever continuing would lose material. Pieces
+    # that leave a line uncover the sliders behind them; pins are ignored.
+    start, end, promotion = move
+    mailbox = board.board
+    piece = mailbox[start[0]][start[1]]
+    victim = mailbox[end[0]][end[1]]
+    removed = {start}
+    if victim is not None:
+        gain = [SEE_VALUES[victim.name]]
+    elif isinstance(piece, Pawn) and start[1] != end[1]:
+        # En passant: the captured pawn stands beside the target square
+        gain = [SEE_VALUES['pawn']]
+        removed.add((start[0], end[1]))
+    else:
+        gain = [0]
+    on_square = SEE_VALUES[piece.name]
+    if promotion is not None:
+        gain[0] += SEE_VALUES[promotion.name] - SEE_VALUES['pawn']
+        on_square = SEE_VALUES[promotion.name]
+
+    side = 'black' if piece.color == 'white' else 'white'
+    while True:
+        attackers = board.attackers(end, side, removed)
+        if not attackers:
+            break
+        value, pos = least_valuable(mailbox, attackers)
+        other = 'black' if side == 'white' else 'white'
+        # The king may only recapture when nothing defends the square
+        if value == SEE_VALUES['king'] and board.attackers(end, other, removed | {pos}):
+            break
+        capture = on_square - gain[-1]
+        # The side to capture is behind whether it takes or not, so what
+        # follows cannot change the result
+        if max(-gain[-1], capture) < 0:
+            break
+        gain.append(capture)
+        removed.add(pos)
+        on_square = value
+        side = other
+
+    # Each side takes the exchange only if it pays, from the last capture back
+    for i in range(len(gain) - 1, 0, -1):
+        gain[i - 1] = -max(-gain[i - 1], gain[i])
+    return gain[0]
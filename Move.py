@@ -0,0 +1,36 @@
+class Move:
+    # One entry of Board.move_history / redo_stack. The geometry is filled
+    # in when the move is created; the state it overwrites (castling rights,
+    # en passant square, halfmove clock and hash) is saved by
+    # Board.apply_move so that Board.unmake_move can restore it exactly.
+    __slots__ = (
+        'piece', 'start', 'end', 'captured', 'captured_pos', 'promotion',
+        'rook_start', 'rook_end',
+        'castling', 'en_passant_target', 'en_passant_key', 'halfmove_clock', 'hash',
+    )
+
+    def __init__(self, piece, start, end, captured=None, captured_pos=None, promotion=None, rook_start=None, rook_end=None):
+        self.piece = piece
+        self.start = start
+        self.end = end
+        self.captured = captured
+        # Differs from `end` only for en passant
+        self.captured_pos = captured_pos
+        self.promotion = promotion
+        # Set only for castling
+        self.rook_start = rook_start
+        self.rook_end = rook_end
+        self.castling = 0
+        self.en_passant_target = None
+        self.en_passant_key = 0
+        self.halfmove_clock = 0
+        self.hash = 0
+
+    def is_castle(self):
+        return self.rook_start is not None
+
+    def is_en_passant(self):
+        return self.captured is not None and self.captured_pos != self.end
+
+    def __repr__(self):
+        return f"Move({self.piece.color} {self.piece.name} {self.start} -> {self.end})"
@@ -0,0 +1,43 @@
+BLACK = (0, 0, 0)
+
+class MoveList:
+    # The move history panel. Each ply is rendered once in SAN and its
+    # surface kept; drawing blits only the visible window of lines, so a
+    # long game costs the same to draw as a short one. Lines are kept per
+    # Move object, which survives undo and redo, so only plies that are
+    # new to the history are ever written and rendered.
+
+    def __init__(self, game, assets, x, y, visible=10, line_height=20, font_size=24):
+        self.game = game
+        self.assets = assets
+        self.x = x
+        self.y = y
+        self.visible = visible
+        self.line_height = line_height
+        self.font_size = font_size
+        # (move, surface) per ply; may run past the history after an undo
+        self.lines = []
+
+    def sync(self):
+        history = self.game.board.move_history
+        # A Move object only ever appears at the ply it was made at, so the
+        # lines are right up to the last one that still matches
+        first = min(len(history), len(self.lines))
+        while first > 0 and self.lines[first - 1][0] is not history[first - 1]:
+            first -= 1
+        if first == len(history):
+            return
+        del self.lines[first:]
+        for ply, text in enumerate(self.game.history_san(first), start=first):
+            number = f"{ply // 2 + 1}." if ply % 2 == 0 else f"{ply // 2 + 1}..."
+            surface = self.assets.font(self.font_size).render(f"{number} {text}", True, BLACK)
+            self.lines.append((history[ply], surface))
+
+    def draw(self, window, scroll_offset):
+        self.sync()
+        window.blit(self.assets.text("Move History", 28, BLACK), (self.x, self.y))
+        y = self.y + 40
+        count = len(self.game.board.move_history)
+        for _, surface in self.lines[scroll_offset:min(count, scroll_offset + self.visible)]:
+            window.blit(surface, (self.x, y))
+            y += self.line_height
@@ -0,0 +1,97 @@
+from Piece import Pawn
+from Transposition import decode_move
+
+# Piece ranks for most-valuable-victim / least-valuable-attacker
+ORDER_VALUES = {'pawn': 1, 'knight': 2, 'bishop': 3, 'rook': 4, 'queen': 5, 'king': 6}
+
+# Score bands, highest first
+HASH_MOVE = 1000000
+CAPTURE = 100000
+PROMOTION = 90000
+KILLER = 80000
+# History scores are kept below the killer band
+HISTORY_LIMIT = 50000
+
+MAX_PLY = 128
+
+
+def mvv_lva(move, board):
+    # Capture score of a (start, end, promotion) move on the Board.board
+    # mailbox, or 0 for a quiet move
+    start, end, _ = move
+    attacker = board[start[0]][start[1]]
+    victim = board[end[0]][end[1]]
+    if victim is None:
+        if isinstance(attacker, Pawn) and start[1] != end[1]:
+            return CAPTURE + ORDER_VALUES['pawn'] * 10 - ORDER_VALUES['pawn']
+        return 0
+    return CAPTURE + ORDER_VALUES[victim.name] * 10 - ORDER_VALUES[attacker.name]
+
+
+class MoveOrderer:
+    # Sorts (start, end, promotion) moves of a ChessGame position for an
+    # alpha-beta search: the transposition table move, then captures by
+    # MVV-LVA, promotions, the two killer moves of the ply, and quiet moves
+    # by how often they caused cutoffs (history heuristic).
+
+    def __init__(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [[0] * 64 for _ in range(64)]
+
+    def clear(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [[0] * 64 for _ in range(64)]
+
+    def new_search(self):
+        # Keep what was learnt, but let the new position outweigh it
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        for row in self.history:
+            for i in range(64):
+                row[i] >>= 2
+
+    def capture_score(self, move, board):
+        return mvv_lva(move, board)
+
+    def score(self, move, board, ply, hash_move=None):
+        start, end, promotion = move
+        if hash_move is not None and start == hash_move[0] and end == hash_move[1] and (promotion.name if promotion is not None else None) == hash_move[2]:
+            return HASH_MOVE
+        score = self.capture_score(move, board)
+        if promotion is not None:
+            score += PROMOTION + ORDER_VALUES[promotion.name]
+        if score:
+            return score
+        killers = self.killers[ply] if ply < MAX_PLY else (None, None)
+        if (start, end) == killers[0]:
+            return KILLER + 1
+        if (start, end) == killers[1]:
+            return KILLER
+        return self.history[start[0] * 8 + start[1]][end[0] * 8 + end[1]]
+
+    def order(self, moves, board, ply, hash_move_code=0):
+        # Returns the moves best first; `board` is the Board.board mailbox
+        hash_move = decode_move(hash_move_code) if hash_move_code else None
+        scored = [(self.score(move, board, ply, hash_move), i) for i, move in enumerate(moves)]
+        scored.sort(reverse=True)
+        return [moves[i] for _, i in scored]
+
+    def is_quiet(self, move, board):
+        return move[2] is None and self.capture_score(move, board) == 0
+
+    def record_cutoff(self, move, board, depth, ply):
+        # Called when `move` caused a beta cutoff; only quiet moves are
+        # remembered, captures are already ordered first
+        if not self.is_quiet(move, board):
+            return
+        start, end, _ = move
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != (start, end):
+                killers[1] = killers[0]
+                killers[0] = (start, end)
+        history = self.history[start[0] * 8 + start[1]]
+        history[end[0] * 8 + end[1]] += depth * depth
+        if history[end[0] * 8 + end[1]] > HISTORY_LIMIT:
+            for row in self.history:
+                for i in range(64):
+                    row[i] >>= 1
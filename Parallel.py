@@ -0,0 +1,230 @@
+import os
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from ChessGame import ChessGame
+from Codec import encode_position, load_position
+from Engine import Engine, SearchResult, SearchTimeout, INFINITY, MATE_BOUND
+from Transposition import TranspositionTable, encode_move
+from config import BOARD_BACKEND
+
+# Transposition table size of each worker. A task only searches the tree
+# below one root move and starts from that move's own entries, so a
+# small table that is cheap to clear serves better than TT_SIZE_MB.
+WORKER_HASH_MB = 2
+
+# Per-process search state, set up by init_worker
+_engine = None
+_backend = BOARD_BACKEND
+
+
+def pack_position(board):
+    # Compact, picklable form of a position for a worker process: its
+    # 32-byte record and the repetition counts of the game so far (no
+    # Piece objects)
+    return encode_position(board), tuple(board.position_counts.items())
+
+def unpack_position(position, backend=BOARD_BACKEND):
+    record, counts = position
+    game = ChessGame(backend)
+    load_position(game.board, record)
+    game.board.position_counts = dict(counts)
+    return game
+
+
+class TaskTable(TranspositionTable):
+    # Worker table that knows which buckets the current task wrote. Its
+    # entries can be exported as bytes and handed to the task that
+    # searches the same root move one ply deeper, which then starts where
+    # the serial search would: with the previous iteration's entries for
+    # that subtree.
+
+    def __init__(self, size_mb):
+        super().__init__(size_mb)
+        self.touched = set()
+
+    def clear(self):
+        # Only the buckets written since the last clear need zeroing
+        keys, data = self.keys, self.data
+        for index in self.touched:
+            keys[index] = keys[index + 1] = data[index] = data[index + 1] = 0
+        self.touched = set()
+        self.generation = 0
+        self.reset_stats()
+
+    def store(self, key, move_code, depth, score, bound):
+        self.touched.add((key & self.mask) << 1)
+        super().store(key, move_code, depth, score, bound)
+
+    def export(self):
+        # (slot, key, record) triples of every entry, as bytes
+        entries = array('Q')
+        for index in self.touched:
+            for slot in (index, index + 1):
+                if self.data[slot]:
+                    entries.extend((slot, self.keys[slot], self.data[slot]))
+        return entries.tobytes()
+
+    def load(self, exported):
+        entries = array('Q', exported)
+        for i in range(0, len(entries), 3):
+            slot = entries[i]
+            self.keys[slot] = entries[i + 1]
+            self.data[slot] = entries[i + 2]
+            self.touched.add(slot & ~1)
+
+
+def init_worker(backend, hash_mb):
+    global _engine, _backend
+    _backend = backend
+    _engine = Engine(None, TaskTable(hash_mb))
+
+def search_root_move(task):
+    # Searches one root move to `depth` plies, looking only for scores
+    # above `alpha`. The worker's table holds only `entries`, those the
+    # same move's task left at the previous depth, and the move ordering
+    # is cleared, so the result depends on the task alone and not on
+    # which moves this worker searched before. `deadline` is a time.time()
+    # value shared by every task of the search, so a task that waited in
+    # the queue does not get a fresh time budget. Returns (score from the
+    # root side's view, at most alpha if the move is no better, or None on
+    # timeout, nodes, quiescence nodes, entries for the next depth).
+    position, move_code, depth, alpha, entries, deadline = task
+    if deadline is not None and time.time() >= deadline:
+        return None, 0, 0, entries
+    engine = _engine
+    engine.game = unpack_position(position, _backend)
+    engine.tt.clear()
+    engine.tt.load(entries)
+    # Entries from the previous depth are one generation old, as they
+    # would be in the serial search
+    engine.tt.generation = depth & 63
+    engine.orderer.clear()
+    engine.reset_stats()
+    engine.deadline = time.perf_counter() + (deadline - time.time()) if deadline is not None else None
+
+    board = engine.game.board
+    move = next(move for move in engine.game.legal_moves() if encode_move(move) == move_code)
+    board.apply_move(board.create_move(*move))
+    try:
+        score = -engine.negamax(depth - 1, -INFINITY, -alpha, 1)
+    except SearchTimeout:
+        score = None
+    return score, engine.nodes, engine.qnodes, engine.tt.export()
+
+
+class ParallelSearch:
+    # Root splitting over a pool of worker processes. Each iteration of
+    # the iterative deepening hands every root move to the pool at once:
+    # the previous best move with a full window, the others with the best
+    # score of two iterations back (same side to move at the leaves) as
+    # their alpha, so no worker waits for the first move. If the first
+    # move then scores below that guess, the moves whose bound falls
+    # between the two are searched again with its score. Every move's
+    # table entries are carried to its task at the next depth. No bound
+    # is shared while the pool is busy and results are merged in root
+    # move order, so the chosen move and score do not depend on the number
+    # of workers or on scheduling.
+
+    def __init__(self, game, workers=None, hash_mb=WORKER_HASH_MB, backend=BOARD_BACKEND):
+        self.game = game
+        self.workers = workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(backend, hash_mb))
+        self.nodes = 0
+        self.qnodes = 0
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, tasks):
+        # Results in task order, or None once a task runs out of time. The
+        # tasks still queued are dropped; those running stop at the
+        # deadline they share.
+        futures = [self.pool.submit(search_root_move, task) for task in tasks]
+        results = []
+        for future in futures:
+            result = future.result()
+            self.nodes += result[1]
+            self.qnodes += result[2]
+            if result[0] is None:
+                for pending in futures:
+                    pending.cancel()
+                return None
+            results.append(result)
+        return results
+
+    def search_depth(self, position, codes, entries, depth, guess, deadline):
+        # One iteration with every root move in the pool at once
+        results = self.run([(position, codes[0], depth, -INFINITY, entries[0], deadline)]
+                           + [(position, codes[i], depth, guess, entries[i], deadline) for i in range(1, len(codes))])
+        if results is None or results[0][0] >= guess:
+            return results
+        # The first move fell below the guess: a move that failed low
+        # against the guess may still be better than it
+        first = results[0][0]
+        again = [i for i in range(1, len(codes)) if first < results[i][0] <= guess]
+        retried = self.run([(position, codes[i], depth, first, results[i][3], deadline) for i in again])
+        if retried is None:
+            return None
+        for i, result in zip(again, retried):
+            results[i] = result
+        return results
+
+    def search(self, max_depth=64, time_limit=None, info=None):
+        start_time = time.perf_counter()
+        deadline = time.time() + time_limit if time_limit is not None else None
+        self.nodes = self.qnodes = 0
+        moves = self.game.legal_moves()
+        if not moves:
+            return SearchResult(None, 0, 0, 0, 0.0)
+        position = pack_position(self.game.board)
+        codes = [encode_move(move) for move in moves]
+        entries = [b''] * len(moves)
+        best_move, best_score, depth_reached = moves[0], -INFINITY, 0
+        scores = []
+
+        for depth in range(1, max_depth + 1):
+            if deadline is not None and time.time() >= deadline:
+                break
+            if scores:
+                guess = scores[-2] if len(scores) > 1 else scores[-1]
+                results = self.search_depth(position, codes, entries, depth, guess, deadline)
+            else:
+                # Nothing to guess from yet: the first move alone, then
+                # the others with its score
+                results = self.run([(position, codes[0], depth, -INFINITY, entries[0], deadline)])
+                if results is not None:
+                    rest = self.run([(position, codes[i], depth, results[0][0], entries[i], deadline)
+                                     for i in range(1, len(codes))])
+                    results = results + rest if rest is not None else None
+            if results is None:
+                break
+
+            # Best first; equal scores (and moves that were no better than
+            # the first) keep the previous iteration's order
+            order = sorted(range(len(codes)), key=lambda i: -results[i][0])
+            moves = [moves[i] for i in order]
+            codes = [codes[i] for i in order]
+            entries = [results[i][3] for i in order]
+            best_move, best_score = moves[0], results[order[0]][0]
+            scores.append(best_score)
+            depth_reached = depth
+            if info is not None:
+                info(self.report(depth, best_score, best_move, start_time))
+            elapsed = time.perf_counter() - start_time
+            if abs(best_score) > MATE_BOUND or (time_limit is not None and elapsed > time_limit / 2):
+                break
+
+        return SearchResult(best_move, best_score, depth_reached, self.nodes, time.perf_counter() - start_time)
+
+    def report(self, depth, score, move, start_time):
+        elapsed = time.perf_counter() - start_time
+        return (f"depth {depth} score {score} nodes {self.nodes} nps {int(self.nodes / max(elapsed, 1e-9))} "
+                f"time {elapsed:.2f} move {self.game.move_to_uci(*move)} qnodes {self.qnodes} workers {self.workers}")
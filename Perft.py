@@ -0,0 +1,136 @@
+import argparse
+import sys
+import time
+
+from Board import START_FEN
+from ChessGame import ChessGame, BOARD_BACKENDS
+from config import BOARD_BACKEND
+
+# Reference positions and their known leaf counts for depth 1, 2, 3, ...
+# (from the Chess Programming Wiki "Perft Results" page)
+SUITE = [
+    ('start position', START_FEN,
+     [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603]),
+    ('position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624]),
+    ('position 4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333]),
+    ('position 4 mirrored', 'r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1',
+     [6, 264, 9467, 422333]),
+    ('position 5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487]),
+    ('position 6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594]),
+]
+
+# Move sequences and whether they end in a threefold repetition. After
+# c7c5 the en passant square only counts towards the position if b5xc6 is
+# legal, which the h5 rook prevents in the first case.
+REPETITIONS = [
+    ('pinned en passant', '4k3/2p5/8/KP5r/8/8/8/8 b - - 0 1',
+     'c7c5 a5a4 e8d8 a4a5 d8e8 a5a4 e8d8 a4a5 d8e8', True),
+    ('legal en passant', '4k3/2p5/8/KP6/8/8/8/8 b - - 0 1',
+     'c7c5 a5a4 e8d8 a4a5 d8e8 a5a4 e8d8 a4a5 d8e8', False),
+]
+
+
+def perft(game, depth, verify=False):
+    # Number of leaf nodes `depth` plies below the current position
+    moves = game.legal_moves()
+    if depth == 1 and not verify:
+        return len(moves)
+    board = game.board
+    nodes = 0
+    for start, end, promotion in moves:
+        if verify:
+            before = (board.to_fen(), board.hash)
+            board.make_move(start, end, promotion)
+            after = (board.to_fen(), board.hash)
+            # Take the move back and play it again through undo/redo, which
+            # must land on exactly the same positions
+            board.undo_move()
+            if (board.to_fen(), board.hash) != before:
+                raise AssertionError(f"undo of {game.move_to_uci(start, end, promotion)} from {before[0]} gave {board.to_fen()}")
+            board.redo_move()
+            if (board.to_fen(), board.hash) != after:
+                raise AssertionError(f"redo of {game.move_to_uci(start, end, promotion)} from {before[0]} gave {board.to_fen()}")
+        else:
+            board.make_move(start, end, promotion)
+        nodes += perft(game, depth - 1, verify) if depth > 1 else 1
+        board.unmake_move()
+    return nodes
+
+
+def divide(game, depth, verify=False):
+    # Leaf counts below each root move, for tracking down a wrong total
+    results = []
+    for start, end, promotion in game.legal_moves():
+        game.board.make_move(start, end, promotion)
+        nodes = perft(game, depth - 1, verify) if depth > 1 else 1
+        game.board.unmake_move()
+        results.append((game.move_to_uci(start, end, promotion), nodes))
+    return results
+
+
+def run(fen, depth, backend=BOARD_BACKEND, show_divide=False, verify=False):
+    game = ChessGame(backend, fen)
+    start_time = time.perf_counter()
+    if show_divide:
+        results = divide(game, depth, verify)
+        for name, nodes in results:
+            print(f"{name}: {nodes}")
+        nodes = sum(count for _, count in results)
+    else:
+        nodes = perft(game, depth, verify)
+    elapsed = time.perf_counter() - start_time
+    return nodes, elapsed
+
+
+def run_suite(max_depth, backend=BOARD_BACKEND, max_nodes=None, verify=False):
+    failures = 0
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected_counts in SUITE:
+        for depth, expected in enumerate(expected_counts[:max_depth], start=1):
+            if max_nodes is not None and expected > max_nodes:
+                break
+            nodes, elapsed = run(fen, depth, backend, verify=verify)
+            total_nodes += nodes
+            total_time += elapsed
+            status = 'ok' if nodes == expected else f'FAIL (expected {expected})'
+            print(f"{name:20} depth {depth}: {nodes:10} {nodes / max(elapsed, 1e-9):10.0f} nps  {status}")
+            failures += nodes != expected
+    for name, fen, moves, expected in REPETITIONS:
+        game = ChessGame(backend, fen)
+        for move in moves.split():
+            game.make_move(game.parse_position(move[:2]), game.parse_position(move[2:4]))
+        repeated = game.is_threefold_repetition()
+        status = 'ok' if repeated == expected else f'FAIL (expected {expected})'
+        print(f"{name:20} threefold repetition {repeated}  {status}")
+        failures += repeated != expected
+    print(f"total {total_nodes} nodes in {total_time:.2f}s, {total_nodes / max(total_time, 1e-9):.0f} nps, {failures} failures")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count move generation leaf nodes (perft)")
+    parser.add_argument('depth', type=int, nargs='?', default=3)
+    parser.add_argument('--fen', default=START_FEN)
+    parser.add_argument('--divide', action='store_true', help="print the node count below each root move")
+    parser.add_argument('--suite', action='store_true', help="run the reference positions up to DEPTH")
+    parser.add_argument('--max-nodes', type=int, help="skip suite entries with more nodes than this")
+    parser.add_argument('--verify', action='store_true', help="check every move against undo/redo (slower)")
+    parser.add_argument('--backend', choices=sorted(BOARD_BACKENDS), default=BOARD_BACKEND)
+    args = parser.parse_args()
+
+    if args.suite:
+        sys.exit(1 if run_suite(args.depth, args.backend, args.max_nodes, args.verify) else 0)
+
+    nodes, elapsed = run(args.fen, args.depth, args.backend, args.divide, args.verify)
+    print(f"nodes {nodes} time {elapsed:.2f}s nps {nodes / max(elapsed, 1e-9):.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import mmap
+import os
+import re
+
+from Board import START_FEN
+from ChessGame import ChessGame
+from config import BOARD_BACKEND
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+# The value runs to the last quote, so tags from writers that leave inner
+# quotes unescaped are still read
+TAG_PATTERN = re.compile(r'\[\s*([A-Za-z0-9_]+)\s+"(.*)"\s*\]$')
+ESCAPE_PATTERN = re.compile(r'\\(.)')
+# Comment and variation delimiters, or a run of anything else
+TOKEN_PATTERN = re.compile(r'[{}();]|[^\s{}();]+')
+# A move number, which may be written against its move: '12.Nf3'
+MOVE_NUMBER_PATTERN = re.compile(r'\d+(?:\.+|$)')
+LINE_LENGTH = 80
+
+
+class PgnError(ValueError):
+    # `game` holds the moves replayed before the one that failed, if any
+    def __init__(self, message, game=None, ply=None):
+        super().__init__(message)
+        self.game = game
+        self.ply = ply
+
+
+class PgnGame:
+    # One game as read from a PGN file: its tags, its mainline moves in
+    # SAN and its result. Comments, variations and NAGs are dropped.
+
+    def __init__(self, tags, moves, result):
+        self.tags = tags
+        self.moves = moves
+        self.result = result
+
+    def replay(self, backend=BOARD_BACKEND):
+        # The game played out in a ChessGame, from the FEN tag if there is
+        # one. A move that is not legal raises PgnError with the game up
+        # to that move.
+        try:
+            game = ChessGame(backend, self.tags.get('FEN'))
+        except ValueError as error:
+            raise PgnError(f"Bad FEN tag: {error}") from None
+        for ply, san in enumerate(self.moves):
+            try:
+                game.make_move(*game.parse_san(san))
+            except ValueError as error:
+                raise PgnError(f"Ply {ply + 1}: {error}", game, ply + 1) from None
+        return game
+
+    def __repr__(self):
+        return f"PgnGame({self.tags.get('White', '?')} - {self.tags.get('Black', '?')}, {len(self.moves)} plies, {self.result})"
+
+
+def read_games(source, use_mmap=False):
+    # Yields the games of a PGN file one at a time, so an archive of any
+    # size is read in constant memory. `source` is a path or an open file
+    # (text or binary). With use_mmap a path is memory-mapped and its
+    # lines are read straight from the mapping.
+    if not isinstance(source, (str, os.PathLike)):
+        yield from parse_lines(source)
+        return
+    if not use_mmap:
+        with open(source, encoding='utf-8', errors='replace') as file:
+            yield from parse_lines(file)
+        return
+    with open(source, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from parse_lines(iter(buffer.readline, b''))
+
+def parse_lines(lines):
+    # The PGN parser proper, over any iterable of lines (str or bytes)
+    tags = {}
+    moves = []
+    in_comment = False
+    depth = 0
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        if in_comment:
+            end = line.find('}')
+            if end < 0:
+                continue
+            in_comment = False
+            line = line[end + 1:]
+        stripped = line.strip()
+        if not stripped or stripped[0] == '%':
+            continue
+        if stripped[0] == '[' and depth == 0:
+            match = TAG_PATTERN.match(stripped)
+            if match is not None:
+                if moves:
+                    # A new game started before the last one gave a result
+                    yield PgnGame(tags, moves, '*')
+                    tags, moves = {}, []
+                tags[match.group(1)] = ESCAPE_PATTERN.sub(r'\1', match.group(2))
+                continue
+
+        for token in TOKEN_PATTERN.findall(stripped):
+            if in_comment:
+                if token == '}':
+                    in_comment = False
+            elif token == '{':
+                in_comment = True
+            elif token == ';':
+                break
+            elif token == '(':
+                depth += 1
+            elif token == ')':
+                depth = max(0, depth - 1)
+            elif depth or token[0] == '$':
+                continue
+            elif token in RESULTS:
+                yield PgnGame(tags, moves, token)
+                tags, moves = {}, []
+            else:
+                number = MOVE_NUMBER_PATTERN.match(token)
+                if number is not None:
+                    token = token[number.end():]
+                if token:
+                    moves.append(token)
+    if tags or moves:
+        yield PgnGame(tags, moves, '*')
+
+
+def game_result(game):
+    status = game.status()
+    if status.checkmate:
+        return '0-1' if status.turn == 'white' else '1-0'
+    if status.is_draw:
+        return '1/2-1/2'
+    return '*'
+
+def start_fen(game):
+    # FEN of the position before the first move of the game
+    board = game.board
+    moves = list(board.move_history)
+    for _ in moves:
+        board.unmake_move()
+    fen = board.to_fen()
+    for move in moves:
+        board.apply_move(move)
+    return fen
+
+def game_to_pgn(game, tags=None):
+    # The moves played in `game` as PGN text. The Seven Tag Roster is
+    # filled with '?' where `tags` does not give a value, and a game that
+    # did not start from the initial position gets SetUp and FEN tags.
+    headers = dict.fromkeys(SEVEN_TAG_ROSTER, '?')
+    headers['Date'] = '????.??.??'
+    headers['Result'] = game_result(game)
+    fen = start_fen(game)
+    if fen != START_FEN:
+        headers['SetUp'] = '1'
+        headers['FEN'] = fen
+    headers.update(tags or {})
+
+    lines = [f'[{name} "{_escape(value)}"]' for name, value in headers.items()]
+    lines.append('')
+
+    fields = fen.split()
+    number = int(fields[5])
+    # Plies are counted from white's move of the first move number
+    offset = 1 if fields[1] == 'b' else 0
+    words = []
+    for ply, san in enumerate(game.history_san(), start=offset):
+        if ply % 2 == 0:
+            words.append(f"{number + ply // 2}.")
+        elif ply == offset:
+            words.append(f"{number}...")
+        words.append(san)
+    words.append(headers['Result'])
+
+    line = ''
+    for word in words:
+        if line and len(line) + 1 + len(word) > LINE_LENGTH:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+def write_game(file, game, tags=None):
+    # Appends the game to an open text file, followed by the blank line
+    # that separates games
+    file.write(game_to_pgn(game, tags))
+    file.write('\n')
@@ -1,15 +1,135 @@
+KNIGHT_OFFSETS = ((2, 1), (1, 2), (-1, 2), (-2, 1), (-2, -1), (-1, -2), (1, -2), (2, -1))
+KING_OFFSETS = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1))
+ROOK_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+# Material values in centipawns
+PIECE_VALUES = {'pawn': 100, 'knight': 320, 'bishop': 330, 'rook': 500, 'queen': 900, 'king': 0}
+
+# Board geometry, worked out once at import so that move validation and
+# attack detection only look squares up
+SQUARES = tuple((row, col) for row in range(8) for col in range(8))
+
+def _targets(offsets):
+    return {(row, col): tuple((row + d_row, col + d_col) for d_row, d_col in offsets
+                              if 0 <= row + d_row < 8 and 0 <= col + d_col < 8)
+            for row, col in SQUARES}
+
+def _ray(row, col, d_row, d_col):
+    squares = []
+    row, col = row + d_row, col + d_col
+    while 0 <= row < 8 and 0 <= col < 8:
+        squares.append((row, col))
+        row, col = row + d_row, col + d_col
+    return tuple(squares)
+
+# Squares a pawn of each color on each square attacks, and a knight or
+# king moves to
+PAWN_TARGETS = {'white': _targets(((-1, -1), (-1, 1))), 'black': _targets(((1, -1), (1, 1)))}
+KNIGHT_TARGETS = _targets(KNIGHT_OFFSETS)
+KING_TARGETS = _targets(KING_OFFSETS)
+# The squares from each square to the edge in each direction, nearest
+# first
+RAYS = {(row, col): {direction: _ray(row, col, *direction) for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+        for row, col in SQUARES}
+# The non-empty rays per square for each kind of slider
+STRAIGHT_RAYS = {pos: tuple(RAYS[pos][d] for d in ROOK_DIRECTIONS if RAYS[pos][d]) for pos in SQUARES}
+DIAGONAL_RAYS = {pos: tuple(RAYS[pos][d] for d in BISHOP_DIRECTIONS if RAYS[pos][d]) for pos in SQUARES}
+QUEEN_RAYS = {pos: STRAIGHT_RAYS[pos] + DIAGONAL_RAYS[pos] for pos in SQUARES}
+# For every two squares on a common rank, file or diagonal, the direction
+# from the first to the second and the squares strictly between them
+DIRECTION = {}
+BETWEEN = {}
+for _start in SQUARES:
+    for _direction, _squares in RAYS[_start].items():
+        for _i, _end in enumerate(_squares):
+            DIRECTION[_start, _end] = _direction
+            BETWEEN[_start, _end] = _squares[:_i]
+
+def clear_path(start, end, board):
+    # True if the squares strictly between `start` and `end`, which share
+    # a rank, file or diagonal, are all empty
+    for row, col in BETWEEN[start, end]:
+        if board[row][col] is not None:
+            return False
+    return True
+
 class Piece:
-    def __init__(self, color):
-        self.color = color
+    # Pieces are immutable flyweights: Pawn('white') always returns the one
+    # white pawn, so a position holds references only. Anything that
+    # depends on a piece's history, such as castling rights, is kept by the
+    # board.
+    __slots__ = ('color',)
+    name = None
+    _instances = {}
+
+    def __new__(cls, color):
+        piece = Piece._instances.get((cls, color))
+        if piece is None:
+            piece = object.__new__(cls)
+            object.__setattr__(piece, 'color', color)
+            Piece._instances[cls, color] = piece
+        return piece
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} pieces are immutable")
+
+    def __reduce__(self):
+        # Copies and unpickled pieces are the shared instance too
+        return type(self), (self.color,)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.color!r})"
 
     def is_valid_move(self, start, end, board):
         pass
 
+    def generate_moves(self, start, board, en_passant_target=None):
+        return iter(())
+
+    def slide(self, start, board, rays):
+        # Walk each ray until the edge or the first piece, which is
+        # included when it can be captured
+        for ray in rays:
+            for row, col in ray:
+                target_piece = board[row][col]
+                if target_piece is None:
+                    yield (row, col)
+                else:
+                    if target_piece.color != self.color:
+                        yield (row, col)
+                    break
+
+    def ray_move(self, start, end, board, straight, diagonal):
+        # Shared by the sliders: a move along an allowed line over empty
+        # squares to an empty or enemy square
+        direction = DIRECTION.get((start, end))
+        if direction is None:
+            return False
+        if not (straight if 0 in direction else diagonal):
+            return False
+        if not clear_path(start, end, board):
+            return False
+        target_piece = board[end[0]][end[1]]
+        return target_piece is None or target_piece.color != self.color
+
+    def leap(self, start, board, targets):
+        for row, col in targets:
+            target_piece = board[row][col]
+            if target_piece is None or target_piece.color != self.color:
+                yield (row, col)
+
+    def step_move(self, start, end, board, targets):
+        # Shared by the knight and king: a move to one of the target
+        # squares that is empty or holds an enemy piece
+        if end not in targets[start]:
+            return False
+        target_piece = board[end[0]][end[1]]
+        return target_piece is None or target_piece.color != self.color
+
 class Pawn(Piece):
-    def __init__(self, color):
-        super().__init__(color)
-        self.has_moved = False
-        self.promotion = None
+    __slots__ = ()
+    name = 'pawn'
 
     def is_valid_move(self, start, end, board, en_passant_target=None):
         direction = -1 if self.color == 'white' else 1
@@ -22,7 +142,6 @@ class Pawn(Piece):
             if end_row == start_row + direction and board[end_row][end_col] is None:
                 return True
             # Initial two-step move
-            """ not self.has_moved """
             if  (start_row == 6 or start_row==1) and end_row == start_row + 2 * direction and board[end_row][end_col] is None and board[start_row + direction][end_col] is None:
                 return True
 
@@ -39,6 +158,32 @@ class Pawn(Piece):
 
         return False
 
+    def generate_moves(self, start, board, en_passant_target=None):
+        direction = -1 if self.color == 'white' else 1
+        start_row, start_col = start
+        row = start_row + direction
+        if not 0 <= row < 8:
+            return
+
+        # Move forward, two steps from the initial rank
+        if board[row][start_col] is None:
+            yield (row, start_col)
+            initial_row = 6 if self.color == 'white' else 1
+            if start_row == initial_row and board[row + direction][start_col] is None:
+                yield (row + direction, start_col)
+
+        # Capture diagonally, including en passant
+        for col in (start_col - 1, start_col + 1):
+            if 0 <= col < 8:
+                target_piece = board[row][col]
+                if target_piece is not None:
+                    if target_piece.color != self.color:
+                        yield (row, col)
+                elif en_passant_target == (row, col):
+                    captured_pawn = board[start_row][col]
+                    if captured_pawn and captured_pawn.color != self.color and isinstance(captured_pawn, Pawn):
+                        yield (row, col)
+
     def promote(self, end):
         end_row, _ = end
         if (self.color == 'white' and end_row == 0) or (self.color == 'black' and end_row == 7):
@@ -46,132 +191,63 @@ class Pawn(Piece):
         return False
 
 class Rook(Piece):
-
-    def __init__(self, color):
-        super().__init__(color)
-        self.has_moved = False
+    __slots__ = ()
+    name = 'rook'
     
     def is_valid_move(self, start, end, board):
         # Straight line movement (horizontal or vertical)
-        start_row, start_col = start
-        end_row, end_col = end
-        # Check that the movement is in a straight line
-        if start_row == end_row or start_col == end_col:
-            # Validate that there are no pieces in the way
-            if self.clear_path(start, end, board):
-                target_piece = board[end_row][end_col]
-                # Ensure not moving to a square occupied by a piece of the same color
-                if target_piece is None or target_piece.color != self.color:
-                    return True
-        return False
+        return self.ray_move(start, end, board, straight=True, diagonal=False)
 
     def clear_path(self, start, end, board):
-        # Check that the path is clear between start and end
-        start_row, start_col = start
-        end_row, end_col = end
-        step_row = (end_row - start_row) // max(1, abs(end_row - start_row))
-        step_col = (end_col - start_col) // max(1, abs(end_col - start_col))
-        current_row, current_col = start_row + step_row, start_col + step_col
+        return clear_path(start, end, board)
 
-        while (current_row, current_col) != (end_row, end_col):
-            if board[current_row][current_col] is not None:
-                return False
-            current_row += step_row
-            current_col += step_col
-        return True
+    def generate_moves(self, start, board, en_passant_target=None):
+        return self.slide(start, board, STRAIGHT_RAYS[start])
 
 class Knight(Piece):
-
-    def __init__(self, color):
-        super().__init__(color)
-        self.has_moved = False
+    __slots__ = ()
+    name = 'knight'
 
     def is_valid_move(self, start, end, board):
-        start_row, start_col = start
-        end_row, end_col = end
-        row_diff = abs(start_row - end_row)
-        col_diff = abs(start_col - end_col)
-
-        # Knight movement
-        if (row_diff, col_diff) in [(2, 1), (1, 2)]:
-            # Check that the target square is not occupied by a piece of the same color
-            target_piece = board[end_row][end_col]
-            if target_piece is not None and target_piece.color == board[start_row][start_col].color:
-                return False
-            return True
-        
-        return False
+        return self.step_move(start, end, board, KNIGHT_TARGETS)
 
-class Bishop(Piece):
+    def generate_moves(self, start, board, en_passant_target=None):
+        return self.leap(start, board, KNIGHT_TARGETS[start])
 
-    def __init__(self, color):
-        super().__init__(color)
-        self.has_moved = False
+class Bishop(Piece):
+    __slots__ = ()
+    name = 'bishop'
 
     def is_valid_move(self, start, end, board):
-        start_row, start_col = start
-        end_row, end_col = end
         # Diagonal movement
-        if abs(start_row - end_row) == abs(start_col - end_col):
-            # Check that there are no pieces in the way
-            if self.clear_path(start, end, board):
-                # Check that the target square is not occupied by a piece of the same color
-                target_piece = board[end_row][end_col]
-                if target_piece is not None and target_piece.color == board[start_row][start_col].color:
-                    return False
-                return True
-        
-        return False
+        return self.ray_move(start, end, board, straight=False, diagonal=True)
 
     def clear_path(self, start, end, board):
-        step_row = 1 if end[0] > start[0] else -1
-        step_col = 1 if end[1] > start[1] else -1
-        current_row, current_col = start[0] + step_row, start[1] + step_col
+        return clear_path(start, end, board)
 
-        while (current_row, current_col) != (end[0], end[1]):
-            if board[current_row][current_col] is not None:
-                return False
-            current_row += step_row
-            current_col += step_col
-        return True
+    def generate_moves(self, start, board, en_passant_target=None):
+        return self.slide(start, board, DIAGONAL_RAYS[start])
 
 class Queen(Piece):
-
-    def __init__(self, color):
-        super().__init__(color)
-        self.has_moved = False
+    __slots__ = ()
+    name = 'queen'
 
     def is_valid_move(self, start, end, board):
         # Combines rook and bishop movements
-        return Rook(self.color).is_valid_move(start, end, board) or Bishop(self.color).is_valid_move(start, end, board)
+        return self.ray_move(start, end, board, straight=True, diagonal=True)
+
+    def generate_moves(self, start, board, en_passant_target=None):
+        return self.slide(start, board, QUEEN_RAYS[start])
 
 class King(Piece):
-    def __init__(self, color):
-        super().__init__(color)
-        self.has_moved = False
+    __slots__ = ()
+    name = 'king'
 
     def is_valid_move(self, start, end, board):
-        start_row, start_col = start
-        end_row, end_col = end
-        row_diff = abs(start_row - end_row)
-        col_diff = abs(start_col - end_col)
-
-        # Normal king movement
-        if row_diff <= 1 and col_diff <= 1:
-            # Check that the target square is not occupied by a piece of the same color
-            target_piece = board[end_row][end_col]
-            if target_piece is not None and target_piece.color == board[start_row][start_col].color:
-                return False
-            return True
-        # Castling
-        if not self.has_moved and row_diff == 0 and col_diff == 2:
-            rook_col = 0 if end_col < start_col else 7
-            rook = board[start_row][rook_col]
-            if isinstance(rook, Rook) and not rook.has_moved:
-                step = 1 if end_col > start_col else -1
-                for col in range(start_col + step, end_col, step):
-                    if board[start_row][col] is not None:
-                        return False
-                return True
+        # Castling depends on the board's castling rights and is checked
+        # by ChessGame
+        return self.step_move(start, end, board, KING_TARGETS)
 
-        return False
+    def generate_moves(self, start, board, en_passant_target=None):
+        # Castling moves come from Board.castling_moves
+        return self.leap(start, board, KING_TARGETS[start])
@@ -0,0 +1,100 @@
+import pygame
+
+WHITE = (255, 255, 255)
+LAST_MOVE_COLOR = (255, 255, 0)
+VALID_MOVE_COLOR = (0, 255, 0)
+CHECK_COLOR = (255, 0, 0)
+
+class Renderer:
+    # Redraws only what changed since the last frame. Everything except
+    # the dragged piece is kept in a scene surface: the board squares,
+    # composed from a background pre-rendered once per orientation, and
+    # the side panel sections. Each frame draws only the squares and
+    # sections whose contents changed into the scene, copies those areas
+    # and the old and new drag sprite areas to the window, and hands just
+    # those rectangles to pygame.display.update.
+
+    def __init__(self, window, view, images, square_size):
+        self.window = window
+        self.view = view
+        self.images = images
+        self.square_size = square_size
+        self.scene = pygame.Surface(window.get_size())
+        self.scene.fill(WHITE)
+        self.backgrounds = {}
+        self.sprite_rect = None
+        self.dirty = []
+        self.invalidate()
+
+    def invalidate(self):
+        # Redraw the whole window on the next frame, e.g. after a dialog
+        # has drawn over it
+        self.squares = [None] * 64
+        self.panels = {}
+        self.full = True
+
+    def background(self, flipped):
+        if flipped not in self.backgrounds:
+            surface = pygame.Surface((8 * self.square_size, 8 * self.square_size))
+            self.view.draw_board(surface, self.square_size, flipped)
+            self.backgrounds[flipped] = surface
+        return self.backgrounds[flipped]
+
+    def draw_squares(self, flipped, last_move=(), valid_moves=(), check_pos=None):
+        board = self.view.board.board
+        background = self.background(flipped)
+        size = self.square_size
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                pos = (row, col)
+                key = (flipped, f"{piece.color}_{piece.name}" if piece else None,
+                       pos in last_move, pos in valid_moves, pos == check_pos)
+                if self.squares[row * 8 + col] == key:
+                    continue
+                self.squares[row * 8 + col] = key
+                if flipped:
+                    rect = pygame.Rect((7 - col) * size, (7 - row) * size, size, size)
+                else:
+                    rect = pygame.Rect(col * size, row * size, size, size)
+                self.scene.blit(background, rect, rect)
+                if key[2]:
+                    pygame.draw.rect(self.scene, LAST_MOVE_COLOR, rect, 3)
+                if piece:
+                    self.scene.blit(self.images[key[1]], rect)
+                if key[3]:
+                    pygame.draw.rect(self.scene, VALID_MOVE_COLOR, rect, 3)
+                if key[4]:
+                    pygame.draw.rect(self.scene, CHECK_COLOR, rect, 3)
+                self.dirty.append(rect)
+
+    def draw_panel(self, name, rect, key, draw, *args):
+        # Calls draw(scene, *args) on a cleared `rect` only when `key`, the
+        # value the section shows, differs from the last frame
+        if name in self.panels and self.panels[name] == key:
+            return
+        self.panels[name] = key
+        rect = pygame.Rect(rect)
+        self.scene.fill(WHITE, rect)
+        draw(self.scene, *args)
+        self.dirty.append(rect)
+
+    def present(self, sprite=None, sprite_center=None):
+        # Shows the frame, with `sprite` (the dragged piece) on top
+        dirty = self.dirty
+        if self.full:
+            dirty = [self.window.get_rect()]
+            self.full = False
+        if self.sprite_rect is not None:
+            dirty.append(self.sprite_rect)
+        sprite_rect = sprite.get_rect(center=sprite_center) if sprite is not None else None
+        if sprite_rect is not None:
+            dirty.append(sprite_rect)
+        for rect in dirty:
+            self.window.blit(self.scene, rect, rect)
+        if sprite_rect is not None:
+            self.window.blit(sprite, sprite_rect)
+        if dirty:
+            pygame.display.update(dirty)
+        self.sprite_rect = sprite_rect
+        self.dirty = []
@@ -0,0 +1,111 @@
+from array import array
+
+from config import TT_SIZE_MB
+
+# Bound types
+EXACT = 1
+LOWER = 2  # the score is at least this (the search failed high)
+UPPER = 3  # the score is at most this (the search failed low)
+
+PROMOTION_NAMES = ('queen', 'rook', 'bishop', 'knight')
+
+ENTRY_BYTES = 16  # one 64-bit key and one 64-bit packed record
+SCORE_OFFSET = 1 << 31
+
+# Packed record layout, low bits first:
+#   move 16 (from 6, to 6, promotion 3) | depth 8 | bound 2 | generation 6 | score 32
+DEPTH_SHIFT = 16
+BOUND_SHIFT = 24
+GENERATION_SHIFT = 26
+SCORE_SHIFT = 32
+
+
+def encode_move(move):
+    if move is None:
+        return 0
+    (start_row, start_col), (end_row, end_col), promotion = move
+    code = (start_row * 8 + start_col) | (end_row * 8 + end_col) << 6
+    if promotion is not None:
+        code |= (PROMOTION_NAMES.index(promotion.name) + 1) << 12
+    return code
+
+def decode_move(code):
+    # Returns (start, end, promotion name or None)
+    promotion = code >> 12 & 7
+    return divmod(code & 63, 8), divmod(code >> 6 & 63, 8), PROMOTION_NAMES[promotion - 1] if promotion else None
+
+
+class TranspositionTable:
+    # Fixed-size hash table of search results keyed by the 64-bit Zobrist
+    # hash. Entries live in two preallocated arrays, so memory use is set
+    # by size_mb and never grows. Each bucket has two slots: the first keeps
+    # the deepest result (unless it is left over from an older search), the
+    # second always takes the newest one.
+
+    def __init__(self, size_mb=TT_SIZE_MB):
+        entries = max(2, size_mb * 1024 * 1024 // ENTRY_BYTES)
+        buckets = 1 << (entries // 2).bit_length() - 1
+        self.mask = buckets - 1
+        self.keys = array('Q', bytes(8 * 2 * buckets))
+        self.data = array('Q', bytes(8 * 2 * buckets))
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        # Probes whose bucket was filled by other positions
+        self.collisions = 0
+
+    @property
+    def size_mb(self):
+        return len(self.keys) * ENTRY_BYTES / (1024 * 1024)
+
+    def clear(self):
+        self.keys = array('Q', bytes(8 * len(self.keys)))
+        self.data = array('Q', bytes(8 * len(self.data)))
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = self.misses = self.collisions = 0
+
+    def new_search(self):
+        # Entries from earlier searches become the first to be replaced
+        self.generation = (self.generation + 1) & 63
+
+    def probe(self, key):
+        # Returns (move code, depth, score, bound) or None
+        index = (key & self.mask) << 1
+        keys = self.keys
+        for slot in (index, index + 1):
+            if keys[slot] == key:
+                record = self.data[slot]
+                if record:
+                    self.hits += 1
+                    return (record & 0xFFFF, record >> DEPTH_SHIFT & 0xFF,
+                            (record >> SCORE_SHIFT) - SCORE_OFFSET, record >> BOUND_SHIFT & 3)
+        self.misses += 1
+        if self.data[index] or self.data[index + 1]:
+            self.collisions += 1
+        return None
+
+    def store(self, key, move_code, depth, score, bound):
+        index = (key & self.mask) << 1
+        record = (move_code | depth << DEPTH_SHIFT | bound << BOUND_SHIFT
+                  | self.generation << GENERATION_SHIFT | (score + SCORE_OFFSET) << SCORE_SHIFT)
+        deep = self.data[index]
+        if (self.keys[index] == key or not deep or depth >= (deep >> DEPTH_SHIFT & 0xFF)
+                or (deep >> GENERATION_SHIFT & 63) != self.generation):
+            slot = index
+        else:
+            slot = index + 1
+        self.keys[slot] = key
+        self.data[slot] = record
+
+    def usage(self):
+        # Permille of slots holding an entry from the current search,
+        # sampled over the first 1000 slots
+        sample = min(1000, len(self.data))
+        used = sum(1 for record in self.data[:sample] if record and (record >> GENERATION_SHIFT & 63) == self.generation)
+        return used * 1000 // sample
+
+    def stats(self):
+        return f"hits {self.hits} misses {self.misses} collisions {self.collisions} full {self.usage()}/1000"
@@ -0,0 +1,17 @@
+import random
+
+# Fixed seed so that hashes are the same in every process and every run
+_random = random.Random(0x5EED)
+
+def _key():
+    return _random.getrandbits(64)
+
+PIECE_KEYS = {
+    (color, name): [_key() for _ in range(64)]
+    for color in ('white', 'black')
+    for name in ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+}
+BLACK_TO_MOVE = _key()
+# One key per castling rights mask (see Board.castling_rights)
+CASTLING_KEYS = [0] + [_key() for _ in range(15)]
+EN_PASSANT_KEYS = [_key() for _ in range(8)]
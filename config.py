@@ -1,2 +1,6 @@
 FLIP_BOARD = False  # Set to False to disable board flipping
-INITIAL_TIME = 300  # Initial time for each player in seconds
\ No newline at end of file
+INITIAL_TIME = 300  # Initial time for each player in seconds
+BOARD_BACKEND = 'mailbox'  # 'mailbox' (list of lists) or 'bitboard' (64-bit integer sets)
+ENGINE_PLAYERS = ()  # Colors played by the computer, e.g. ('black',) or ('white', 'black')
+TT_SIZE_MB = 16  # Memory for the engine's transposition table
+PGN_FILE = 'games.pgn'  # File the S key in the GUI appends the current game to